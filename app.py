@@ -2,8 +2,8 @@ import streamlit as st
 import pandas as pd
 
 from src.css import load_css
-from src.bq_io import get_bq_client
-from src.queries import get_total_matches_query, get_total_events_query, get_recent_matches_query
+from src.bq_io import get_bq_client, load_schedule_meta, run_query
+from src.queries import get_home_bundle_query, get_total_events_query
 
 st.set_page_config(
     page_title="Prodigy.co Scouting",
@@ -35,21 +35,28 @@ PROJECT_ID = "betterbet-467621" # FIXED based on secrets
 DATASET_ID = "betterdata"
 
 client = get_bq_client(project=PROJECT_ID)
+SCHEDULE_META = load_schedule_meta(client, PROJECT_ID, DATASET_ID)
+
+# Schedule-based tiles (matches + recent activity) come from a single BQ job
+try:
+    sql_home, params_home = get_home_bundle_query(PROJECT_ID, DATASET_ID, schedule_meta=SCHEDULE_META)
+    home = run_query(client, sql_home, params_home).iloc[0]
+except Exception:
+    home = None
 
 # Use columns for layout
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    try:
-        df_matches = client.query(get_total_matches_query(PROJECT_ID, DATASET_ID)).to_dataframe()
-        total_matches = df_matches["total"].iloc[0]
-        st.metric("Total de Partidas", total_matches)
-    except Exception:
+    if home is not None:
+        st.metric("Total de Partidas", home["total_matches"])
+    else:
         st.metric("Total de Partidas", "--")
 
 with col2:
     try:
-        df_events = client.query(get_total_events_query(PROJECT_ID, DATASET_ID)).to_dataframe()
+        # __TABLES__ metadata: own query, so a permission error here only affects this tile
+        df_events = run_query(client, get_total_events_query(PROJECT_ID, DATASET_ID, schedule_meta=SCHEDULE_META))
         total_events = df_events["total"].iloc[0]
         # Format millions/thousands
         if total_events > 1_000_000:
@@ -101,27 +108,31 @@ st.divider()
 
 # --- RECENT ACTIVITY SECTION ---
 st.subheader("Atividade Recente")
-try:
-    df_recent = client.query(get_recent_matches_query(PROJECT_ID, DATASET_ID)).to_dataframe()
-    # Format Date
-    if not df_recent.empty:
-        df_recent["match_date"] = pd.to_datetime(df_recent["match_date"]).dt.strftime('%d/%m/%Y')
-        df_recent = df_recent.rename(columns={
-            "match_date": "Data",
-            "home_team": "Mandante",
-            "away_team": "Visitante",
-            "home_score": "Gols (M)",
-            "away_score": "Gols (V)"
-        })
-        st.dataframe(
-            df_recent[["Data", "Mandante", "Gols (M)", "Gols (V)", "Visitante"]],
-            use_container_width=True,
-            hide_index=True
-        )
-    else:
-        st.info("Nenhuma partida recente encontrada.")
-except Exception as e:
+if home is None:
+    # The home bundle query failed (the tiles above show "--")
     st.warning("Não foi possível carregar as partidas recentes.")
+else:
+    try:
+        df_recent = pd.DataFrame(list(home["recent_matches"]))
+        # Format Date
+        if not df_recent.empty:
+            df_recent["match_date"] = pd.to_datetime(df_recent["match_date"]).dt.strftime('%d/%m/%Y')
+            df_recent = df_recent.rename(columns={
+                "match_date": "Data",
+                "home_team": "Mandante",
+                "away_team": "Visitante",
+                "home_score": "Gols (M)",
+                "away_score": "Gols (V)"
+            })
+            st.dataframe(
+                df_recent[["Data", "Mandante", "Gols (M)", "Gols (V)", "Visitante"]],
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("Nenhuma partida recente encontrada.")
+    except Exception as e:
+        st.warning("Não foi possível carregar as partidas recentes.")
 
 # --- FOOTER / CHECK ---
 st.markdown("---")
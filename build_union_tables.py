@@ -0,0 +1,46 @@
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from src.bq_io import get_bq_client, load_schedule_meta
+from src.queries import (
+    get_create_union_tables_ddl,
+    get_create_stats_rollups_ddl,
+    get_create_events_enhanced_ddl,
+    SCHEDULE_TABLE,
+    EVENTS_TABLE,
+    EVENT_STATS_ROLLUP,
+    PLAYER_MATCH_ROLLUP,
+    PLAYER_NAMES_TABLE,
+    TEAM_MATCH_ROLLUP,
+    EVENTS_ENHANCED_TABLE
+)
+
+PROJECT_ID = "betterbet-467621"
+DATASET_ID = "betterdata"
+
+def build_union_tables():
+    # Rebuilds schedule_all / eventos_all from the per-season tables, then the per-match roll-ups.
+    # Run nightly (and after adding a season); then set UNION_SOURCE = "tables",
+    # USE_STATS_ROLLUPS = True and USE_EVENTS_ENHANCED_TABLE = True in src/queries.py.
+    print(f"Rebuilding {SCHEDULE_TABLE} and {EVENTS_TABLE} in {PROJECT_ID}.{DATASET_ID}...")
+
+    client = get_bq_client(project=PROJECT_ID)
+    # Real timestamp columns / existing seasons, so the DDL only references tables that exist
+    schedule_meta = load_schedule_meta(client, PROJECT_ID, DATASET_ID)
+    client.query(get_create_union_tables_ddl(PROJECT_ID, DATASET_ID, schedule_meta)).result()
+
+    print(f"Rebuilding {EVENT_STATS_ROLLUP}, {PLAYER_MATCH_ROLLUP}, {PLAYER_NAMES_TABLE} and {TEAM_MATCH_ROLLUP}...")
+    client.query(get_create_stats_rollups_ddl(PROJECT_ID, DATASET_ID, schedule_meta)).result()
+
+    print(f"Rebuilding {EVENTS_ENHANCED_TABLE}...")
+    client.query(get_create_events_enhanced_ddl(PROJECT_ID, DATASET_ID, schedule_meta)).result()
+
+    for table in (SCHEDULE_TABLE, EVENTS_TABLE, EVENT_STATS_ROLLUP, PLAYER_MATCH_ROLLUP, PLAYER_NAMES_TABLE, TEAM_MATCH_ROLLUP, EVENTS_ENHANCED_TABLE):
+        t = client.get_table(f"{PROJECT_ID}.{DATASET_ID}.{table}")
+        print(f"{table}: {t.num_rows} rows")
+
+if __name__ == "__main__":
+    build_union_tables()
@@ -0,0 +1,33 @@
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from src.bq_io import get_bq_client, load_schedule_meta
+from src.queries import get_cluster_events_tables_ddl
+
+PROJECT_ID = "betterbet-467621"
+DATASET_ID = "betterdata"
+
+def cluster_event_tables():
+    # One-off: rewrites every eventos_brasileirao_serie_a_{year} clustered by team, type, player.
+    # Re-run for a new season once its table is created by the ingestion.
+    client = get_bq_client(project=PROJECT_ID)
+    # Existing seasons only (tables missing from the dataset are skipped)
+    schedule_meta = load_schedule_meta(client, PROJECT_ID, DATASET_ID)
+
+    ddl = get_cluster_events_tables_ddl(PROJECT_ID, DATASET_ID, schedule_meta=schedule_meta)
+    if not ddl:
+        print(f"No event tables to cluster in {PROJECT_ID}.{DATASET_ID}.")
+        return
+
+    print(f"Clustering event tables in {PROJECT_ID}.{DATASET_ID}...")
+    client.query(ddl).result()
+
+    for t in client.list_tables(f"{PROJECT_ID}.{DATASET_ID}"):
+        if t.table_id.startswith("eventos_brasileirao_serie_a_"):
+            print(f"{t.table_id}: clustering={t.clustering_fields}")
+
+if __name__ == "__main__":
+    cluster_event_tables()
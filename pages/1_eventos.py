@@ -2,18 +2,14 @@ from __future__ import annotations
 
 from typing import List, Tuple, Optional
 import io
-import sys
-import os
-
-# Add project root to sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
 import pandas as pd
+import plotly.graph_objects as go
 from google.cloud import bigquery
 
 # from src.ui_filters import render_sidebar_globals (Removed)
-from src.bq_io import get_bq_client
+from src.bq_io import get_bq_client, get_table_schema, run_query as run_bq_query
 from src.css import load_css
 from src.plots import plot_events_plotly
 
@@ -83,16 +79,14 @@ def union_sql(prefix: str, years: Tuple[int, ...], select_clause: str) -> str:
 
 
 def run_query(sql: str, params: Optional[list] = None) -> pd.DataFrame:
-    client = get_bq_client(project=PROJECT)
-    cfg = bigquery.QueryJobConfig(query_parameters=params or [])
-    return client.query(sql, job_config=cfg).to_dataframe()
+    return run_bq_query(get_bq_client(project=PROJECT), sql, params)
 
 
 @st.cache_data(ttl=3600)
 def detect_match_id_col(prefix: str, year: int) -> str:
     client = get_bq_client(project=PROJECT)
     table_id = f"{PROJECT}.{DATASET}.{prefix}_{int(year)}"
-    schema = client.get_table(table_id).schema
+    schema = get_table_schema(client, table_id)
     cols = [f.name for f in schema]
 
     candidates = [
@@ -470,6 +464,15 @@ def load_events_filtered(
     return df
 
 
+@st.cache_data(ttl=600, show_spinner=False)
+def build_events_figure(plot_df: pd.DataFrame, **plot_kwargs) -> dict:
+    """
+    Figura do mapa de eventos serializada (dict), cacheada pelos dados + opções.
+    Reruns com os mesmos filtros/estilo não reconstroem shapes e traces.
+    """
+    return plot_events_plotly(df=plot_df, **plot_kwargs).to_plotly_json()
+
+
 # =========================================
 # PAGE
 # =========================================
@@ -861,8 +864,8 @@ with c_map:
     # Gera o gráfico
     # Gera o gráfico
     try:
-        fig_plotly = plot_events_plotly(
-            df=plot_df,
+        fig_json = build_events_figure(
+            plot_df,
             pitch_length=PITCH_LENGTH,
             pitch_width=PITCH_WIDTH,
             color_outcome=bool(color_by_outcome),
@@ -878,8 +881,8 @@ with c_map:
         if highlight_type:
              st.warning("⚠️ Cache desatualizado: O destaque de Tipo não pôde ser aplicado. Por favor, limpe o cache e recarregue a página (Sidebar > Limpar Cache).")
         
-        fig_plotly = plot_events_plotly(
-            df=plot_df,
+        fig_json = build_events_figure(
+            plot_df,
             pitch_length=PITCH_LENGTH,
             pitch_width=PITCH_WIDTH,
             color_outcome=bool(color_by_outcome),
@@ -890,6 +893,7 @@ with c_map:
             color_strategy=color_strategy,
             layer_colors=clean_layer_colors
         )
+    fig_plotly = go.Figure(fig_json, _validate=False)
     st.plotly_chart(fig_plotly, use_container_width=True, theme=None)
 
 with c_stats:
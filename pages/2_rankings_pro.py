@@ -1,16 +1,11 @@
 import streamlit as st
 import pandas as pd
-import sys
-import os
-
-# Add project root to sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import plotly.express as px
 from datetime import datetime, timedelta
 
 from src.css import load_css
-from src.bq_io import get_bq_client
+from src.bq_io import get_bq_client, load_schedule_meta, run_query
 from src.queries import (
     get_match_stats_query, 
     get_player_rankings_query, 
@@ -34,6 +29,8 @@ st.title("📈 Rankings Pró (A Favor)")
 PROJECT_ID = "betterbet-467621"
 DATASET_ID = "betterdata"
 
+SCHEDULE_META = load_schedule_meta(get_bq_client(project=PROJECT_ID), PROJECT_ID, DATASET_ID)
+
 
 # --- 1. MAIN CONFIGURATION ---
 col_filter_1, col_filter_2, col_filter_3, col_filter_4 = st.columns(4)
@@ -61,21 +58,21 @@ col_scope_1, col_scope_2 = st.columns(2)
 
 # Load Teams
 @st.cache_data(ttl=3600)
-def load_team_list():
+def load_team_list(schedule_meta=None):
     client = get_bq_client(project=PROJECT_ID)
-    q = get_all_teams_query(PROJECT_ID, DATASET_ID)
-    df = client.query(q).to_dataframe()
+    q = get_all_teams_query(PROJECT_ID, DATASET_ID, schedule_meta)
+    df = run_query(client, q)
     return df["team"].tolist()
 
-ALL_TEAMS = load_team_list()
+ALL_TEAMS = load_team_list(SCHEDULE_META)
 
 # Load Players (Dynamic based on team selection)
 @st.cache_data(ttl=300)
-def load_player_list(selected_teams=None):
+def load_player_list(selected_teams=None, schedule_meta=None):
     client = get_bq_client(project=PROJECT_ID)
     teams_param = selected_teams if selected_teams else None
-    q = get_all_players_query(PROJECT_ID, DATASET_ID, teams_param)
-    df = client.query(q).to_dataframe()
+    q, params = get_all_players_query(PROJECT_ID, DATASET_ID, teams_param, schedule_meta)
+    df = run_query(client, q, params)
     return df["player"].unique().tolist() 
 
 with col_scope_1:
@@ -85,7 +82,7 @@ with col_scope_2:
     sel_players = []
     if subject == "Jogadores":
         # Hierarchical: Filter players by selected teams
-        available_players = load_player_list(sel_teams)
+        available_players = load_player_list(sel_teams, SCHEDULE_META)
         sel_players = st.multiselect("Filtrar Jogadores (Opcional)", available_players, default=[], help="Deixe vazio para ver todos.")
     else:
         st.write("") 
@@ -188,22 +185,22 @@ else:
 # Dynamic Loader
 
 @st.cache_data(ttl=300) 
-def load_dynamic_data(subj, etypes, outs, quals, use_rel, teams, players, a_type, d_types=None, d_outs=None, d_quals=None):
+def load_dynamic_data(subj, etypes, outs, quals, use_rel, teams, players, a_type, d_types=None, d_outs=None, d_quals=None, schedule_meta=None):
     client = get_bq_client(project=PROJECT_ID)
     
     if a_type == "Volume Total":
-        query = get_dynamic_ranking_query(PROJECT_ID, DATASET_ID, subj, etypes, outs, quals, use_rel, teams, players, perspective="pro")
+        query, params = get_dynamic_ranking_query(PROJECT_ID, DATASET_ID, subj, etypes, outs, quals, use_rel, teams, players, perspective="pro", schedule_meta=schedule_meta)
     else:
         # Conversion
-        query = get_conversion_ranking_query(
+        query, params = get_conversion_ranking_query(
             PROJECT_ID, DATASET_ID, subj,
             etypes, outs, quals,
             d_types, d_outs, d_quals,
-            teams, players, perspective="pro"
+            teams, players, perspective="pro", schedule_meta=schedule_meta
         )
 
 
-    df = client.query(query).to_dataframe()
+    df = run_query(client, query, params)
 
     if "match_date" in df.columns:
         df["match_date"] = pd.to_datetime(df["match_date"]).dt.date
@@ -229,7 +226,7 @@ try:
              
         df_raw = load_dynamic_data(
             subject, num_types, num_out, num_qual, False, q_teams, q_players,
-            analysis_type, den_types, den_out, den_qual
+            analysis_type, den_types, den_out, den_qual, schedule_meta=SCHEDULE_META
         )
     else:
         # Standard
@@ -240,7 +237,7 @@ try:
 
         df_raw = load_dynamic_data(
             subject, q_types, q_outcomes, q_qualifiers, use_related, q_teams, q_players,
-            analysis_type
+            analysis_type, schedule_meta=SCHEDULE_META
         )
 
 
@@ -345,8 +342,8 @@ if subject == "Equipes":
 
     # --- TRUE MATCH COUNT LOGIC ---
     # Fetch total matches played by the team in the filtered period
-    matches_query = get_teams_match_count_query(PROJECT_ID, DATASET_ID, q_teams, date_range)
-    df_matches = client.query(matches_query).to_dataframe()
+    matches_query, matches_params = get_teams_match_count_query(PROJECT_ID, DATASET_ID, q_teams, date_range, schedule_meta=SCHEDULE_META)
+    df_matches = run_query(client, matches_query, matches_params)
     
     # Merge matches (Left join to keep agg rows, or inner? Left is safer if stats exist but no match log?)
     # Actually, if stats exist, match log MUST exist.
@@ -410,8 +407,8 @@ elif subject == "Jogadores":
     # Note: get_player_match_counts_query needs logic update to return 'team' col correctly if grouped?
     # Yes, it returns player, team, season, total_games.
     
-    matches_query = get_player_match_counts_query(PROJECT_ID, DATASET_ID, q_teams, q_players, date_range)
-    df_matches = client.query(matches_query).to_dataframe()
+    matches_query, matches_params = get_player_match_counts_query(PROJECT_ID, DATASET_ID, q_teams, q_players, date_range, schedule_meta=SCHEDULE_META)
+    df_matches = run_query(client, matches_query, matches_params)
     
     join_cols = ["player", "team"] # Basic join
     if "season" in groupby_cols:
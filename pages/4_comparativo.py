@@ -1,14 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
-import sys
-import os
-
-# Add project root to sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 from src.css import load_css
-from src.bq_io import get_bq_client
+from src.bq_io import get_bq_client, load_schedule_meta, run_query
 from src.queries import (
     get_all_teams_query, 
     get_all_players_query, 
@@ -37,13 +36,76 @@ with col_conf2:
 
 # --- 2. SELECTION ---
 client = get_bq_client(project=PROJECT_ID)
+SCHEDULE_META = load_schedule_meta(client, PROJECT_ID, DATASET_ID)
 
 @st.cache_data(ttl=3600)
-def load_teams():
-    q = get_all_teams_query(PROJECT_ID, DATASET_ID)
-    return client.query(q).to_dataframe()["team"].tolist()
+def load_teams(schedule_meta=None):
+    q = get_all_teams_query(PROJECT_ID, DATASET_ID, schedule_meta)
+    return run_query(client, q)["team"].tolist()
+
+@st.cache_data(ttl=300)
+def load_players(team=None, schedule_meta=None):
+    t_param = [team] if team and team != "Todos" else None
+    q, params = get_all_players_query(PROJECT_ID, DATASET_ID, t_param, schedule_meta)
+    return run_query(client, q, params)["player"].unique().tolist()
+
+# Only the columns this page filters/sums on
+PLAYER_COLUMNS = [
+    "player", "game_id", "season", "match_date",
+    "goals", "assists", "shots", "successful_passes", "total_passes",
+    "tackles", "interceptions", "recoveries"
+]
+TEAM_COLUMNS = [
+    "team", "match_id", "season", "match_date",
+    "goals_for", "goals_against", "total_shots", "shots_on_target",
+    "successful_passes", "total_passes", "tackles", "interceptions"
+]
+
+@st.cache_data(ttl=300)
+def get_data(mode, period_mode, schedule_meta=None):
+    # Current season only reads that season's tables
+    seasons = [2026] if period_mode == "Temporada Atual (2026)" else None
+    if mode == "Jogadores":
+        query = get_player_rankings_query(PROJECT_ID, DATASET_ID, columns=PLAYER_COLUMNS, seasons=seasons, schedule_meta=schedule_meta)
+    else:
+        query = get_match_stats_query(PROJECT_ID, DATASET_ID, columns=TEAM_COLUMNS, seasons=seasons, schedule_meta=schedule_meta)
+    
+    df = run_query(client, query)
+    
+    # Filter Period
+    if "match_date" in df.columns:
+        df["match_date"] = pd.to_datetime(df["match_date"]).dt.date
+    if "season" in df.columns:
+        df["season"] = df["season"].astype(int)
+
+    if period_mode == "Temporada Atual (2026)":
+        if "season" in df.columns:
+            df = df[df["season"] == 2026]
 
-all_teams = load_teams()
+    # Low-cardinality keys as category: the player/team filters below compare int codes
+    for c in ("player", "team", "season"):
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    
+    return df
+
+# Independent BQ round-trips run concurrently (the client is thread-safe).
+# Worker threads get this run's context so the st.cache_* wrappers work there.
+@st.cache_resource
+def get_executor():
+    # One pool for the whole server process, reused by every rerun and session
+    return ThreadPoolExecutor(max_workers=4)
+
+_ctx = get_script_run_ctx()
+
+def submit(fn, *args):
+    def _run():
+        add_script_run_ctx(threading.current_thread(), _ctx)
+        return fn(*args)
+    return get_executor().submit(_run)
+
+f_data = submit(get_data, mode, period_mode, SCHEDULE_META)
+all_teams = submit(load_teams, SCHEDULE_META).result()
 
 if mode == "Equipes":
     col_sel1, col_sel2 = st.columns(2)
@@ -57,52 +119,31 @@ if mode == "Equipes":
 elif mode == "Jogadores":
     # Helper to filter players
     col_filter1, col_filter2 = st.columns(2)
-    
+
     with col_filter1:
         st.markdown("##### Jogador A")
         team_filter_a = st.selectbox("Filtrar Time (A)", ["Todos"] + all_teams, index=0)
-        
-        @st.cache_data(ttl=300)
-        def load_players(team=None):
-            t_param = [team] if team and team != "Todos" else None
-            q = get_all_players_query(PROJECT_ID, DATASET_ID, t_param)
-            return client.query(q).to_dataframe()["player"].unique().tolist()
-            
-        players_a = load_players(team_filter_a)
-        player_a = st.selectbox("Selecionar Jogador A", players_a)
 
     with col_filter2:
         st.markdown("##### Jogador B")
         team_filter_b = st.selectbox("Filtrar Time (B)", ["Todos"] + all_teams, index=0)
-        players_b = load_players(team_filter_b)
+
+    f_players_a = submit(load_players, team_filter_a, SCHEDULE_META)
+    f_players_b = submit(load_players, team_filter_b, SCHEDULE_META)
+
+    with col_filter1:
+        players_a = f_players_a.result()
+        player_a = st.selectbox("Selecionar Jogador A", players_a)
+
+    with col_filter2:
+        players_b = f_players_b.result()
         player_b = st.selectbox("Selecionar Jogador B", players_b)
 
 st.divider()
 
 # --- 3. DATA FETCHING ---
 
-@st.cache_data(ttl=300)
-def get_data(mode, period_mode):
-    if mode == "Jogadores":
-        query = get_player_rankings_query(PROJECT_ID, DATASET_ID)
-    else:
-        query = get_match_stats_query(PROJECT_ID, DATASET_ID)
-    
-    df = client.query(query).to_dataframe()
-    
-    # Filter Period
-    if "match_date" in df.columns:
-        df["match_date"] = pd.to_datetime(df["match_date"]).dt.date
-    if "season" in df.columns:
-        df["season"] = df["season"].astype(int)
-
-    if period_mode == "Temporada Atual (2026)":
-        if "season" in df.columns:
-            df = df[df["season"] == 2026]
-    
-    return df
-
-df_raw = get_data(mode, period_mode)
+df_raw = f_data.result()
 
 if df_raw.empty:
     st.warning("Sem dados para o período selecionado.")
@@ -141,9 +182,8 @@ if mode == "Jogadores":
     # helper
     def calc_stats(df, label):
         if df.empty: return {k: 0 for k in metrics}
-        res = {}
-        for k, col in metrics.items():
-            res[k] = df[col].sum()
+        sums = df[list(metrics.values())].sum(numeric_only=True)
+        res = {k: sums[col] for k, col in metrics.items()}
         
         # Derived
         res["Jogos"] = df["game_id"].nunique()
@@ -177,9 +217,8 @@ else:
     
     def calc_stats_team(df, label):
         if df.empty: return {k: 0 for k in metrics}
-        res = {}
-        for k, col in metrics.items():
-            res[k] = df[col].sum()
+        sums = df[list(metrics.values())].sum(numeric_only=True)
+        res = {k: sums[col] for k, col in metrics.items()}
             
         res["Jogos"] = df["match_id"].nunique()
         
@@ -200,77 +239,67 @@ else:
 
 # Radar Chart preparation
 # Needs normalization. We calculate max of both to normalize.
+# Cached as a plain figure dict: reruns with the same selection (resize, widget
+# clicks elsewhere) skip the normalization and the Figure/Scatterpolar build.
+@st.cache_data(ttl=300)
+def build_radar(mode, period_mode, label_a, label_b, stats_a, stats_b):
+    # Define Radar Dimensions
+    if mode == "Jogadores":
+        radar_metrics = ["Gols", "Assists", "Chutes", "Passes %", "Desarmes", "Recup"]
+    else:
+        radar_metrics = ["Gols Pró", "Finalizações", "No Alvo", "Passes Certos", "Desarmes", "Clean Sheets"]
 
-# Define Radar Dimensions
-if mode == "Jogadores":
-    radar_metrics = ["Gols", "Assists", "Chutes", "Passes %", "Desarmes", "Recup"]
-else:
-    radar_metrics = ["Gols Pró", "Finalizações", "No Alvo", "Passes Certos", "Desarmes", "Clean Sheets"]
-
-# Normalized
-vals_a = []
-vals_b = []
-ranges = []
+    # Normalized (Per Game, except % metrics which require no divisor)
+    vals_a = np.array([stats_a.get(m, 0) for m in radar_metrics], dtype=float)
+    vals_b = np.array([stats_b.get(m, 0) for m in radar_metrics], dtype=float)
+    is_pct = np.array(["%" in m for m in radar_metrics])
 
-for m in radar_metrics:
-    val_a = stats_a.get(m, 0)
-    val_b = stats_b.get(m, 0)
-    
-    # Per Game Normalization for fairness if game count differs significantly?
-    # Or strict total comparison?
-    # Usually "Per 90" is best. Let's do Per Game.
     games_a = max(1, stats_a.get("Jogos", 1))
     games_b = max(1, stats_b.get("Jogos", 1))
-    
-    # Exceptions: % metrics require no divisor
-    if "%" in m:
-        v_a_norm = val_a
-        v_b_norm = val_b
-    else:
-        v_a_norm = val_a / games_a
-        v_b_norm = val_b / games_b
-        
-    vals_a.append(v_a_norm)
-    vals_b.append(v_b_norm)
-    
-    # Determine max for axis
-    mx = max(v_a_norm, v_b_norm)
-    if mx == 0: mx = 1
-    ranges.append(mx * 1.1) 
-
-
-# Plot Radar
-fig = go.Figure()
-
-fig.add_trace(go.Scatterpolar(
-    r=[v / r for v, r in zip(vals_a, ranges)], # Scaled 0-1 relative to max in this comparison
-    theta=radar_metrics,
-    fill='toself',
-    name=f"{label_a} (norm)",
-    marker=dict(color='#1f77b4')
-))
-
-fig.add_trace(go.Scatterpolar(
-    r=[v / r for v, r in zip(vals_b, ranges)],
-    theta=radar_metrics,
-    fill='toself',
-    name=f"{label_b} (norm)",
-    marker=dict(color='#ff7f0e')
-))
-
-fig.update_layout(
-    polar=dict(
-        radialaxis=dict(visible=True, range=[0, 1])
-    ),
-    showlegend=True,
-    title=f"Comparativo (Normalizado por Jogo) - {label_a} vs {label_b}"
-)
+
+    vals_a = np.where(is_pct, vals_a, vals_a / games_a)
+    vals_b = np.where(is_pct, vals_b, vals_b / games_b)
+
+    # Determine max for axis (scaled 0-1 relative to max in this comparison)
+    mx = np.maximum(vals_a, vals_b)
+    ranges = np.where(mx == 0, 1, mx) * 1.1
+    r_a = (vals_a / ranges).tolist()
+    r_b = (vals_b / ranges).tolist()
+
+    # Plot Radar
+    fig = go.Figure()
+
+    fig.add_trace(go.Scatterpolar(
+        r=r_a,
+        theta=radar_metrics,
+        fill='toself',
+        name=f"{label_a} (norm)",
+        marker=dict(color='#1f77b4')
+    ))
+
+    fig.add_trace(go.Scatterpolar(
+        r=r_b,
+        theta=radar_metrics,
+        fill='toself',
+        name=f"{label_b} (norm)",
+        marker=dict(color='#ff7f0e')
+    ))
+
+    fig.update_layout(
+        polar=dict(
+            radialaxis=dict(visible=True, range=[0, 1])
+        ),
+        showlegend=True,
+        title=f"Comparativo (Normalizado por Jogo) - {label_a} vs {label_b}"
+    )
+    return fig.to_dict()
 
 
 col_main1, col_main2 = st.columns([1, 1])
 
 with col_main1:
-    st.plotly_chart(fig, use_container_width=True)
+    radar = build_radar(mode, period_mode, label_a, label_b, stats_a, stats_b)
+    st.plotly_chart(go.Figure(radar), use_container_width=True)
 
 with col_main2:
     st.subheader("Dados Absolutos")
@@ -282,31 +311,26 @@ with col_main2:
         all_metrics_keys.remove("Jogos")
         all_metrics_keys = ["Jogos"] + all_metrics_keys
         
-    data = []
-    for k in all_metrics_keys:
-        va = stats_a[k]
-        vb = stats_b[k]
-        
-        # Format
-        if isinstance(va, float): fa = f"{va:.1f}"
-        else: fa = str(va)
-        
-        if isinstance(vb, float): fb = f"{vb:.1f}"
-        else: fb = str(vb)
-        
-        # Diff
-        diff = ""
-        if isinstance(va, (int, float)) and isinstance(vb, (int, float)):
-             d_val = va - vb
-             if d_val > 0: diff = f"🔺 {label_a} (+{d_val:.1f})"
-             elif d_val < 0: diff = f"🔻 {label_b} (+{abs(d_val):.1f})"
-             else: diff = "="
-             
-        data.append({
-            "Métrica": k,
-            label_a: fa,
-            label_b: fb,
-            "Diferença": diff
-        })
-        
-    st.dataframe(pd.DataFrame(data), use_container_width=True, hide_index=True)
+    cmp = pd.DataFrame({
+        "Métrica": all_metrics_keys,
+        label_a: [stats_a.get(k, 0) for k in all_metrics_keys],
+        label_b: [stats_b.get(k, 0) for k in all_metrics_keys],
+    })
+    
+    # Diff
+    d = cmp[label_a].astype(float) - cmp[label_b].astype(float)
+    leader = pd.Series(
+        np.select([d > 0, d < 0], [f"🔺 {label_a} (+", f"🔻 {label_b} (+"], default=""),
+        index=cmp.index
+    )
+    cmp["Diferença"] = (leader + d.abs().round(1).astype(str) + ")").where(d != 0, "=")
+    
+    # Format (integers without decimals, floats with 1)
+    def _fmt(v):
+        return f"{v:.0f}" if float(v).is_integer() else f"{v:.1f}"
+    
+    st.dataframe(
+        cmp.style.format({label_a: _fmt, label_b: _fmt}, na_rep=""),
+        use_container_width=True,
+        hide_index=True
+    )
@@ -1,13 +1,9 @@
 import streamlit as st
 import pandas as pd
-import sys
-import os
+import numpy as np
 
-# Add project root to sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-from src.bq_io import get_bq_client
-from src.queries import get_teams_match_count_query
+from src.bq_io import get_bq_client, load_schedule_meta, run_query
+from src.queries import get_teams_match_count_query, get_metrics_validation_query, get_events_column_drift_query
 from src.css import load_css
 
 st.set_page_config(page_title="Diagnóstico de Dados", page_icon="🔧", layout="wide")
@@ -25,16 +21,18 @@ st.divider()
 PROJECT_ID = "betterbet-467621"
 DATASET_ID = "betterdata"
 
+client = get_bq_client(project=PROJECT_ID)
+SCHEDULE_META = load_schedule_meta(client, PROJECT_ID, DATASET_ID)
+
 @st.cache_data(ttl=60)
-def load_audit_data():
-    client = get_bq_client(project=PROJECT_ID)
-    query = get_teams_match_count_query(PROJECT_ID, DATASET_ID)
-    df = client.query(query).to_dataframe()
+def load_audit_data(schedule_meta=None):
+    query, params = get_teams_match_count_query(PROJECT_ID, DATASET_ID, schedule_meta=schedule_meta)
+    df = run_query(client, query, params)
     return df
 
 try:
     with st.spinner("Auditando base de dados..."):
-        df = load_audit_data()
+        df = load_audit_data(SCHEDULE_META)
 except Exception as e:
     st.error(f"Erro ao auditar dados: {e}")
     st.stop()
@@ -44,22 +42,23 @@ if df.empty:
     st.stop()
 
 # --- LOGIC ---
-# Highlight logic
-def highlight_rows(row):
-    # Rule: If season is completed (<= 2024 for example), it MUST be 38.
-    # If 2025 (current), it can be anything.
-    # Let's assume 2024 passed.
-    
-    season = row['season']
-    games = row['total_games']
-    
-    current_season = 2025 # Or dynamic
-    
-    if season < current_season and games != 38:
-        return ['background-color: #551111'] * len(row)
-    elif season < current_season and games == 38:
-        return ['background-color: #113311'] * len(row)
-    return [''] * len(row)
+# Rule: If season is completed (< current season), it MUST be 38.
+# If current season, it can be anything.
+CURRENT_SEASON = 2025 # Or dynamic
+EXPECTED_GAMES = 38
+
+def style_audit(data: pd.DataFrame, mask_bad: pd.Series, mask_good: pd.Series) -> pd.DataFrame:
+    # Highlight logic (whole table at once, reusing the precomputed masks)
+    css = np.select(
+        [mask_bad.to_numpy(dtype=bool, na_value=False), mask_good.to_numpy(dtype=bool, na_value=False)],
+        ['background-color: #551111', 'background-color: #113311'],
+        default=''
+    )
+    return pd.DataFrame(
+        np.repeat(css[:, None], data.shape[1], axis=1),
+        index=data.index,
+        columns=data.columns
+    )
 
 st.subheader("Relatório de Jogos por Equipe/Temporada")
 
@@ -74,18 +73,21 @@ else:
 
 # --- METRICS & TABS ---
 c1, c2 = st.columns(2)
-problems = df_show[ (df_show['season'] < 2025) & (df_show['total_games'] != 38) ]
+past_season = df_show['season'] < CURRENT_SEASON
+mask_bad = past_season & (df_show['total_games'] != EXPECTED_GAMES)
+mask_good = past_season & (df_show['total_games'] == EXPECTED_GAMES)
+n_problems = int(mask_bad.sum())
 c1.metric("Registros Analisados (Linhas)", len(df_show))
-c2.metric("Inconsistências (Linhas)", len(problems), delta_color="inverse")
+c2.metric("Inconsistências (Linhas)", n_problems, delta_color="inverse")
 
-if not problems.empty:
-    st.warning(f"⚠️ Atenção! Encontradas {len(problems)} registros com número de jogos diferente de 38 em temporadas passadas.")
+if n_problems:
+    st.warning(f"⚠️ Atenção! Encontradas {n_problems} registros com número de jogos diferente de {EXPECTED_GAMES} em temporadas passadas.")
 
 tab_detail, tab_macro = st.tabs(["📋 Detalhado (Por Temporada)", "🔎 Visão Macro (Acumulado)"])
 
 with tab_detail:
     st.dataframe(
-        df_show.style.apply(highlight_rows, axis=1),
+        df_show.style.apply(style_audit, axis=None, mask_bad=mask_bad, mask_good=mask_good),
         use_container_width=True,
         height=800
     )
@@ -124,27 +126,10 @@ st.subheader("🔍 Validação de Métricas: Assistências vs KeyPasses")
 
 if st.button("Executar Diagnóstico Cruzado"):
     try:
-        client = get_bq_client(project=PROJECT_ID)
-        
-        # Query 1: Count KeyPasses (Standard)
-        q_kp = f"""
-        SELECT COUNT(*) as cnt 
-        FROM `{PROJECT_ID}.{DATASET_ID}.eventos_brasileirao_serie_a_2024`
-        WHERE type = 'Pass' 
-        AND REGEXP_CONTAINS(qualifiers, r"['\\\"]displayName['\\\"]\\s*:\\s*['\\\"]KeyPass['\\\"]")
-        """
-        df_kp = client.query(q_kp).to_dataframe()
-        val_kp = df_kp['cnt'].iloc[0]
-        
-        # Query 2: Count True Assists (Goal Relationship)
-        q_assist = f"""
-        SELECT COUNT(*) as cnt
-        FROM `{PROJECT_ID}.{DATASET_ID}.eventos_brasileirao_serie_a_2024`
-        WHERE type = 'Goal' 
-        AND related_player_id IS NOT NULL
-        """
-        df_assist = client.query(q_assist).to_dataframe()
-        val_assist = df_assist['cnt'].iloc[0]
+        # KeyPasses (Standard) + True Assists (Goal Relationship) in one round-trip
+        row = run_query(client, get_metrics_validation_query(PROJECT_ID, DATASET_ID, 2024)).iloc[0]
+        val_kp = row['key_passes']
+        val_assist = row['assists']
         
         col1, col2, col3 = st.columns(3)
         col1.metric("Key Passes (Passes Decisivos)", val_kp)
@@ -159,3 +144,27 @@ if st.button("Executar Diagnóstico Cruzado"):
         
     except Exception as e:
         st.error(f"Erro no diagnóstico: {e}")
+
+st.divider()
+st.subheader("🧬 Tipos de Colunas dos Eventos (Entre Temporadas)")
+
+if st.button("Verificar Tipos"):
+    try:
+        # Metadata only: the multi-season events scan needs one type per column across years
+        df_drift = run_query(client, get_events_column_drift_query(PROJECT_ID, DATASET_ID))
+        if df_drift.empty:
+            st.success("✅ Todas as colunas têm o mesmo tipo em todas as temporadas.")
+        else:
+            st.error("⚠️ Colunas com tipos diferentes entre temporadas: as consultas multi-temporada vão falhar.")
+            st.dataframe(
+                df_drift,
+                use_container_width=True,
+                column_config={
+                    "column_name": "Coluna",
+                    "data_type": "Tipo",
+                    "seasons": "Temporadas"
+                },
+                hide_index=True
+            )
+    except Exception as e:
+        st.error(f"Erro na verificação: {e}")
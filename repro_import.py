@@ -2,9 +2,9 @@ import sys
 import os
 
 # Simulate Streamlit adding root to path
-# Real path: .../Streamlit/pages/repro_import.py
+# Real path: .../Streamlit/repro_import.py
 # Root: .../Streamlit/
-root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+root_dir = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(root_dir)
 
 print(f"Added root to path: {root_dir}")
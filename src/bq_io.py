@@ -1,21 +1,68 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Iterator, Optional, Tuple
 import pandas as pd
 import streamlit as st
 from google.cloud import bigquery
 
 
 DEFAULT_PROJECT_ID = "betterbet-467621"
+DEFAULT_DATASET_ID = "betterdata"
+
+def get_bq_client(project: Optional[str] = None) -> bigquery.Client:
+    """
+    Retorna o cliente do BigQuery compartilhado entre as páginas.
+    `project` é normalizado antes de chegar no cache, então `None` e
+    DEFAULT_PROJECT_ID reutilizam o mesmo cliente (um único canal HTTP).
+    """
+    return _get_bq_client(project or DEFAULT_PROJECT_ID)
+
+
+def load_schedule_meta(
+    client: bigquery.Client, project_id: str, dataset_id: str
+) -> Optional[Tuple[Tuple[int, str, bool], ...]]:
+    """
+    Metadados das tabelas de schedule do dataset: ((ano, coluna, é_timestamp), ...),
+    com a coluna de data de cada ano ('date' ou 'start_time').
+    Passado explicitamente aos builders de `src.queries` (`schedule_meta=`).
+    Se a consulta falhar, retorna None (heurística por ano) e a falha não
+    fica no cache: a próxima execução tenta de novo.
+    """
+    try:
+        return _load_schedule_meta(client, project_id, dataset_id)
+    except Exception:
+        return None
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _load_schedule_meta(_client: bigquery.Client, project_id: str, dataset_id: str) -> tuple:
+    sql = f"""
+        SELECT
+            CAST(REGEXP_EXTRACT(table_name, r'_(\\d{{4}})$') AS INT64) as year,
+            IF(LOGICAL_OR(column_name = 'start_time'), 'start_time', 'date') as ts_col,
+            IF(
+                LOGICAL_OR(column_name = 'start_time'),
+                LOGICAL_OR(column_name = 'start_time' AND data_type = 'TIMESTAMP'),
+                LOGICAL_OR(column_name = 'date' AND data_type = 'TIMESTAMP')
+            ) as ts_is_timestamp
+        FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMNS`
+        WHERE REGEXP_CONTAINS(table_name, r'^schedule_brasileirao_serie_a_\\d{{4}}$')
+            AND column_name IN ('start_time', 'date')
+        GROUP BY 1
+        ORDER BY 1
+    """
+    df = run_query(_client, sql)
+    return tuple(
+        (int(year), str(ts_col), bool(is_ts))
+        for year, ts_col, is_ts in zip(df["year"], df["ts_col"], df["ts_is_timestamp"])
+    )
+
 
 @st.cache_resource(ttl=3600)
-def get_bq_client(project: Optional[str] = None, _cache_version: int = 2) -> bigquery.Client:
+def _get_bq_client(target_project: str, _cache_version: int = 2) -> bigquery.Client:
     """
     Cria cliente do BigQuery.
     """
-    # Force default if None provided
-    target_project = project or DEFAULT_PROJECT_ID
-    
     # 1. Tenta pegar do dicionário 'gcp_service_account'
     if "gcp_service_account" in st.secrets:
         from google.oauth2 import service_account
@@ -31,18 +78,16 @@ def get_bq_client(project: Optional[str] = None, _cache_version: int = 2) -> big
 
     # 2. Tenta pegar da raiz (Caso o usuário tenha colado apenas o conteúdo sem o header)
     elif "private_key" in st.secrets and "project_id" in st.secrets:
-        # st.write("✅ Encontrou secrets na raiz") # Debug
         from google.oauth2 import service_account
         # Converter st.secrets (que pode ser um proxy) para dict
         info = dict(st.secrets)
         credentials = service_account.Credentials.from_service_account_info(info)
-        project = project or info.get("project_id")
-        return bigquery.Client(credentials=credentials, project=project)
+        return bigquery.Client(credentials=credentials, project=target_project)
 
     # 3. Fallback: Tenta credenciais do ambiente (local com gcloud auth login)
     try:
         # Tenta instanciar. Se falhar (sem projeto/creds), vai cair no except.
-        client = bigquery.Client(project=project) if project else bigquery.Client()
+        client = bigquery.Client(project=target_project)
         # Teste simples para ver se o ciente realmente funciona (opcional, mas bom pra validar)
         # client.query("SELECT 1") 
         return client
@@ -60,6 +105,59 @@ def get_bq_client(project: Optional[str] = None, _cache_version: int = 2) -> big
         st.stop() # Para a execução aqui para o usuário ler a mensagem
 
 
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_table_schema(_client: bigquery.Client, table_fqdn: str) -> tuple:
+    """
+    Schema (SchemaFields) de uma tabela, via tables.get.
+    Cacheado por `projeto.dataset.tabela`: reruns e páginas diferentes
+    não repetem a chamada de metadados.
+    """
+    return tuple(_client.get_table(table_fqdn).schema)
+
+
+def run_query(client: bigquery.Client, sql: str, params: Optional[list] = None) -> pd.DataFrame:
+    """
+    Executa `sql` com os parâmetros (`ScalarQueryParameter`/`ArrayQueryParameter`)
+    dos builders de `src.queries` e retorna o resultado como DataFrame.
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=params or [])
+    return client.query(sql, job_config=job_config).to_dataframe()
+
+
+def _table_query(table_fqdn: str, where: Optional[str] = None, limit: Optional[int] = None) -> str:
+    query = f"SELECT * FROM `{table_fqdn}`"
+    if where:
+        query += f" WHERE {where}"
+    if limit is not None:
+        query += f" LIMIT {int(limit)}"
+    return query
+
+
+def load_table_batches(
+    client: bigquery.Client,
+    table_fqdn: str,
+    where: Optional[str] = None,
+    limit: Optional[int] = None,
+    batch_size: int = 100_000,
+    bqstorage_client=None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê uma tabela do BigQuery em blocos (um DataFrame por página/stream).
+    Mesmos filtros e mesmos dtypes de `load_table` (Int64 nulável, dbdate...),
+    mas sem materializar o resultado inteiro.
+    bqstorage_client: `BigQueryReadClient` opcional para ler via Storage API;
+    sem ele as páginas vêm da API REST com `batch_size` linhas.
+    """
+    rows = client.query(_table_query(table_fqdn, where, limit)).result(page_size=batch_size)
+    empty = True
+    for frame in rows.to_dataframe_iterable(bqstorage_client=bqstorage_client):
+        empty = False
+        yield frame
+    if empty:
+        # Resultado vazio: ainda devolve as colunas do schema
+        yield pd.DataFrame(columns=[field.name for field in rows.schema])
+
+
 def load_table(
     client: bigquery.Client,
     table_fqdn: str,
@@ -71,13 +169,8 @@ def load_table(
     table_fqdn: `projeto.dataset.tabela`
     where: condição SQL sem o 'WHERE' (ex: "season = 2025 AND team = 'Cruzeiro'")
     """
-    query = f"SELECT * FROM `{table_fqdn}`"
-    if where:
-        query += f" WHERE {where}"
-    if limit is not None:
-        query += f" LIMIT {int(limit)}"
-
-    return client.query(query).to_dataframe()
+    # Resultado inteiro de uma vez: to_dataframe usa a Storage API quando disponível
+    return client.query(_table_query(table_fqdn, where, limit)).to_dataframe()
 
 
 def load_events(
@@ -1,22 +1,47 @@
+import base64
+import copy
+import functools
+
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 from typing import Optional
 
-def create_pitch(
-    pitch_length: float = 105.0,
-    pitch_width: float = 68.0,
-    line_color: str = "#c9cdd1",
-    pitch_color: str = "#0e1117",
-) -> go.Figure:
+# Event type substring -> marker symbol (first match wins, same order as before)
+_SYMBOL_RULES = [
+    ("pass", "triangle-up"),
+    ("shot", "circle"),
+    ("goal", "circle"),
+    ("duel", "square"),
+    ("tackle", "square"),
+    ("interception", "square"),
+    ("foul", "square"),
+    ("save", "diamond-tall"),
+]
+
+# WebGL markers only render a subset of the SVG symbols
+_GL_SYMBOL_FALLBACK = {"diamond-tall": "diamond", "hexagon": "circle"}
+
+def _event_symbols(types: pd.Series, draw_arrows: bool = False) -> np.ndarray:
     """
-    Creates the base football pitch using Plotly shapes.
+    Maps event types to marker symbols in a single vectorized pass.
+    Passes become circles when arrows are drawn (the arrow head marks direction).
     """
-    fig = go.Figure()
+    low = types.astype(str).str.lower()
+    conds = [low.str.contains(k, regex=False).fillna(False).to_numpy(dtype=bool) for k, _ in _SYMBOL_RULES]
+    choices = [v for _, v in _SYMBOL_RULES]
+    if draw_arrows:
+        choices[0] = "circle"
+    return np.select(conds, choices, default="hexagon").astype(object)
 
-    # Define Pitch Dimensions
-    L = pitch_length
-    W = pitch_width
+N_STRIPES = 18
 
+@functools.lru_cache(maxsize=8)
+def _build_pitch_shapes(L: float, W: float, line_color: str, pitch_color: str) -> tuple:
+    """
+    Builds the pitch shapes (stripes first, then markings). Pure function of its
+    arguments, memoized so reruns reuse the same shape dicts.
+    """
     # Pitch Outline
     # Define Stripe Colors (Two-tone Green/Grey optimized for Dark Mode)
     # Pitch color input is usually very dark (#0e1117). We want a subtle variation.
@@ -27,10 +52,9 @@ def create_pitch(
     
     # Grass Stripes (every 5.5m approx, or just 10-12 divisions)
     # Standard pitch is 105m long. 105 / 18 stripes = ~5.8m per stripe
-    n_stripes = 18
-    stripe_width = L / n_stripes
+    stripe_width = L / N_STRIPES
     
-    for i in range(0, n_stripes, 2):
+    for i in range(0, N_STRIPES, 2):
         shapes.append(
             dict(
                 type="rect",
@@ -61,9 +85,52 @@ def create_pitch(
         # Goal Area Right
         dict(type="rect", x0=L-5.5, y0=(W-18.32)/2, x1=L, y1=(W+18.32)/2, line=dict(color=line_color, width=2)),
     ])
+    return tuple(shapes)
 
-    fig.update_layout(
+@functools.lru_cache(maxsize=8)
+def _stripes_image_uri(L: float, W: float, pitch_color: str) -> str:
+    """
+    The grass stripes as a single SVG data URI (same geometry/colors as the stripe shapes).
+    """
+    stripe_color = "#161b22" if pitch_color == "#0e1117" else "rgba(255,255,255,0.05)"
+    stripe_width = L / N_STRIPES
+    rects = "".join(
+        f'<rect x="{i * stripe_width:.3f}" y="0" width="{stripe_width:.3f}" height="{W}" fill="{stripe_color}"/>'
+        for i in range(0, N_STRIPES, 2)
+    )
+    svg = f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {L} {W}" preserveAspectRatio="none">{rects}</svg>'
+    return "data:image/svg+xml;base64," + base64.b64encode(svg.encode()).decode()
+
+def create_pitch(
+    pitch_length: float = 105.0,
+    pitch_width: float = 68.0,
+    line_color: str = "#c9cdd1",
+    pitch_color: str = "#0e1117",
+    stripes_as_image: bool = False,
+) -> go.Figure:
+    """
+    Creates the base football pitch using Plotly shapes.
+    stripes_as_image: draws the grass stripes as one background image instead of
+    individual rect shapes (fewer SVG nodes under dense event maps).
+    """
+    # Define Pitch Dimensions
+    L = pitch_length
+    W = pitch_width
+
+    # Shapes are copied per figure so the memoized dicts are never mutated
+    shapes = [copy.deepcopy(shape) for shape in _build_pitch_shapes(L, W, line_color, pitch_color)]
+    images = []
+    if stripes_as_image:
+        shapes = shapes[(N_STRIPES + 1) // 2:]  # stripe rects come first
+        images = [dict(
+            source=_stripes_image_uri(L, W, pitch_color),
+            xref="x", yref="y", x=0, y=W, sizex=L, sizey=W,
+            sizing="stretch", layer="below"
+        )]
+
+    layout = dict(
         shapes=shapes,
+        images=images,
         xaxis=dict(range=[-5, L+5], showgrid=False, zeroline=False, visible=False, fixedrange=True),
         yaxis=dict(range=[-5, W+5], showgrid=False, zeroline=False, visible=False, fixedrange=True, scaleanchor="x", scaleratio=1),
         plot_bgcolor=pitch_color,
@@ -80,7 +147,151 @@ def create_pitch(
             font=dict(color=line_color)
         )
     )
-    return fig
+    return go.Figure(layout=layout, _validate=False)
+
+def _coords(col: pd.Series) -> np.ndarray:
+    """
+    Pitch coordinates (meters) as float arrays rounded to the centimeter.
+    Plotly writes each value with its shortest repr, so this keeps the figure JSON
+    at ~5 digits per value instead of 15-17 for raw float64 noise.
+    """
+    return np.round(col.to_numpy(dtype=float, na_value=np.nan), 2)
+
+def _build_event_traces(groups: list, draw_arrows: bool = False, gl_threshold: int = 5000) -> list:
+    """
+    Turns the (sub_df, name, color, symbol, opacity, size) subsets into trace dicts.
+    Symbols, hover text and coordinates are built once over all subsets; each subset
+    then gets its own markers / arrow-line / arrow-head traces sharing a legendgroup,
+    so clicking a legend entry hides its points and arrows.
+    Above `gl_threshold` events, markers and lines switch to WebGL (`scattergl`);
+    arrow heads stay SVG because `scattergl` has no marker angle.
+    """
+    if not groups:
+        return []
+
+    df = pd.concat([g[0] for g in groups], ignore_index=True)
+    # Subsets are contiguous in df: bounds[i]:bounds[i + 1] is subset i
+    bounds = np.concatenate(([0], np.cumsum([len(g[0]) for g in groups])))
+
+    # Symbols: per-row from the type, unless the subset forces one
+    types = df["type"] if "type" in df.columns else pd.Series("", index=df.index)
+    symbols = _event_symbols(types, draw_arrows)
+
+    trace_type = "scattergl" if len(df) > gl_threshold else "scatter"
+    if trace_type == "scattergl":
+        for svg_symbol, gl_symbol in _GL_SYMBOL_FALLBACK.items():
+            symbols[symbols == svg_symbol] = gl_symbol
+
+    # Build Hover Text (column-wise string concatenation)
+    type_str = types.astype(str).fillna("Event") if "type" in df.columns else pd.Series("Event", index=df.index)
+    p_name = df["player"].fillna("Unknown").astype(str) if "player" in df.columns else pd.Series("Unknown", index=df.index)
+    min_str = df["expanded_minute"].astype(str).fillna("-") + "'"
+
+    hover = "<b>" + type_str + "</b><br>" + p_name + "<br>Min: " + min_str + "<br>"
+    if "outcome_type" in df.columns:
+        hover = hover + "Outcome: " + df["outcome_type"].astype(str).fillna("-") + "<br>"
+    if "kv_qualifiers" in df.columns:
+        tags = df["kv_qualifiers"].str.join(", ").fillna("")
+        hover = hover + ("Tags: " + tags).where(tags != "", "")
+    hover = np.asarray(hover.tolist(), dtype=object)
+
+    # Start coordinates as float arrays (cm precision), shared by the markers and the arrow geometry
+    sx = _coords(df["x_plot"])
+    sy = _coords(df["y_plot"])
+
+    arrows = draw_arrows and "end_x_plot" in df.columns and "end_y_plot" in df.columns
+    if arrows:
+        ex = _coords(df["end_x_plot"])
+        ey = _coords(df["end_y_plot"])
+        has_end = ~np.isnan(ex) & ~np.isnan(ey)
+
+    traces = []
+    for i, (_, name, color, symbol, opacity, size) in enumerate(groups):
+        part = slice(bounds[i], bounds[i + 1])
+        group = f"group-{i}"
+
+        # 1. Main Scatter Trace (Markers - Start Point)
+        traces.append(dict(
+            type=trace_type,
+            x=sx[part],
+            y=sy[part],
+            mode="markers",
+            name=name,
+            legendgroup=group,
+            marker=dict(
+                size=size,
+                color=color,
+                symbol=symbol if symbol is not None else symbols[part].tolist(),
+                opacity=opacity,
+                line=dict(width=1, color="black"),
+            ),
+            text=hover[part].tolist(),
+            hoverinfo="text"
+        ))
+
+        if not arrows:
+            continue
+        sel = has_end[part]
+        n = int(sel.sum())
+        if not n:
+            continue
+        gsx, gsy = sx[part][sel], sy[part][sel]
+        gex, gey = ex[part][sel], ey[part][sel]
+
+        # 2. Arrow Lines (Pattern: x1, x2, NaN, x3, x4, NaN...)
+        arr_x = np.full(n * 3, np.nan)
+        arr_y = np.full(n * 3, np.nan)
+        arr_x[0::3], arr_x[1::3] = gsx, gex
+        arr_y[0::3], arr_y[1::3] = gsy, gey
+        traces.append(dict(
+            type=trace_type,
+            x=arr_x,
+            y=arr_y,
+            mode="lines",
+            name=f"{name} (Trajetória)",
+            legendgroup=group,
+            line=dict(color=color, width=1.5),
+            opacity=opacity,
+            showlegend=False,
+            hoverinfo="skip"
+        ))
+
+        # 3. Arrow Heads (Markers)
+        # Plotly Marker Angle:
+        # 0 = Up (12 o'clock)
+        # Increases CLOCKWISE
+        # atan2:
+        # 0 = Right (3 o'clock)
+        # Increases COUNTER-CLOCKWISE
+        #
+        # Mapping:
+        # Math 0 (Right)   -> Plotly 90
+        # Math 90 (Up)     -> Plotly 0
+        # Math 180 (Left)  -> Plotly 270 (-90)
+        # Math -90 (Down)  -> Plotly 180
+        #
+        # Formula: 90 - MathAngle
+        angles = np.round(90.0 - np.degrees(np.arctan2(gey - gsy, gex - gsx)), 1)
+        traces.append(dict(
+            type="scatter",
+            x=gex,
+            y=gey,
+            mode="markers",
+            name=f"{name} (Pontas)",
+            legendgroup=group,
+            marker=dict(
+                symbol="triangle-up", # Using standard triangle
+                size=10,
+                color=color,
+                angle=angles,
+                standoff=0
+            ),
+            opacity=opacity,
+            showlegend=False,
+            hoverinfo="skip"
+        ))
+
+    return traces
 
 def plot_events_plotly(
     df: pd.DataFrame,
@@ -92,10 +303,12 @@ def plot_events_plotly(
     highlight_type: Optional[str] = None,
     theme_colors: Optional[dict] = None,
     color_strategy: str = "Resultado (Sucesso/Falha)",
-    layer_colors: Optional[dict] = None
+    layer_colors: Optional[dict] = None,
+    gl_threshold: int = 5000
 ) -> go.Figure:
     """
     Plots events on top of the Plotly pitch.
+    Above `gl_threshold` events the markers are rendered with WebGL.
     """
     if theme_colors is None:
         theme_colors = {}
@@ -103,7 +316,8 @@ def plot_events_plotly(
     line_color = theme_colors.get("pitch_line_color", "#c9cdd1")
     pitch_bg = theme_colors.get("fig_bg", "#0e1117")
     
-    fig = create_pitch(pitch_length, pitch_width, line_color, pitch_bg)
+    # Dense maps: stripes as one background image instead of 9 rect shapes
+    fig = create_pitch(pitch_length, pitch_width, line_color, pitch_bg, stripes_as_image=len(df) > 2000)
     
     # Defaults
     def_color = theme_colors.get("event_color", "#A0A0A0")
@@ -112,129 +326,12 @@ def plot_events_plotly(
     hl_color = theme_colors.get("highlight_color", "#FFD700")
 
     # Split Data Logic
-    traces = []
+    # Each subset only records its style here; the traces are assembled once at the end
+    groups = []
     
-    # Helper to map event types to shapes
-    def get_event_symbol(event_type):
-        etype = str(event_type).lower()
-        if "pass" in etype: return "circle" if draw_arrows else "triangle-up"
-        if "shot" in etype or "goal" in etype: return "circle"
-        if "duel" in etype or "tackle" in etype or "interception" in etype or "foul" in etype: return "square"
-        if "save" in etype: return "diamond-tall"
-        return "hexagon" # specific generic
-
-    # Helper to create trace
+    # Helper to register a subset (symbol=None -> per-row symbol from the event type)
     def add_trace(sub_df, name, color, symbol=None, opacity=0.8, size=8):
-        # Build Hover Text
-        hover_texts = []
-        
-        # Lists for Arrow Lines (Pattern: x1, x2, None, x3, x4, None...)
-        arr_x = []
-        arr_y = []
-        
-        # Lists for Arrow Heads
-        head_x = []
-        head_y = []
-        head_angles = []
-        
-        # Determine Symbols: If fixed symbol is None, calculate from Type
-        if symbol is None:
-            symbols = [get_event_symbol(getattr(r, "type", "")) for r in sub_df.itertuples()]
-        else:
-            symbols = symbol
-
-        # Check if we have end coordinates for arrows
-        has_end = ("end_x_plot" in sub_df.columns and "end_y_plot" in sub_df.columns)
-
-        for r in sub_df.itertuples():
-            min_str = f"{r.expanded_minute}'"
-            p_name = getattr(r, "player", "Unknown")
-            type_str = getattr(r, "type", "Event")
-            
-            txt = f"<b>{type_str}</b><br>{p_name}<br>Min: {min_str}<br>"
-            if "outcome_type" in sub_df.columns:
-                txt += f"Outcome: {r.outcome_type}<br>"
-            if "kv_qualifiers" in sub_df.columns:
-                q_list = getattr(r, "kv_qualifiers", [])
-                if q_list:
-                    txt += f"Tags: {', '.join(q_list)}"
-            hover_texts.append(txt)
-
-            # Collect Arrow Lines (efficient method)
-            if draw_arrows and has_end:
-                ex, ey = getattr(r, "end_x_plot", None), getattr(r, "end_y_plot", None)
-                sx, sy = r.x_plot, r.y_plot
-                
-                if pd.notna(ex) and pd.notna(ey):
-                    arr_x.extend([sx, ex, None])
-                    arr_y.extend([sy, ey, None])
-                    
-                    # Calculate angle for arrowhead
-                    dy = ey - sy
-                    dx = ex - sx
-                    import math
-                    angle_math = math.degrees(math.atan2(dy, dx))
-                    head_x.append(ex)
-                    head_y.append(ey)
-                    
-                    # Plotly Marker Angle:
-                    # 0 = Up (12 o'clock)
-                    # Increases CLOCKWISE
-                    # math.atan2:
-                    # 0 = Right (3 o'clock)
-                    # Increases COUNTER-CLOCKWISE
-                    #
-                    # Mapping:
-                    # Math 0 (Right)   -> Plotly 90
-                    # Math 90 (Up)     -> Plotly 0
-                    # Math 180 (Left)  -> Plotly 270 (-90)
-                    # Math -90 (Down)  -> Plotly 180
-                    #
-                    # Formula: 90 - MathAngle
-                    head_angles.append(90 - angle_math)
-
-        # 1. Main Scatter Traces (Markers - Start Point)
-        traces.append(go.Scatter(
-            x=sub_df["x_plot"],
-            y=sub_df["y_plot"],
-            mode="markers",
-            name=name,
-            marker=dict(size=size, color=color, symbol=symbols, opacity=opacity, line=dict(width=1, color="black")),
-            text=hover_texts,
-            hoverinfo="text"
-        ))
-        
-        # 2. Optimized Arrow Trace (Lines)
-        if arr_x:
-            traces.append(go.Scatter(
-                x=arr_x,
-                y=arr_y,
-                mode="lines",
-                name=f"{name} (Trajetória)",
-                line=dict(color=color, width=1.5),
-                opacity=opacity, # Use function arg
-                showlegend=False,
-                hoverinfo="skip"
-            ))
-            
-        # 3. Optimized Arrow Heads (Markers)
-        if head_x:
-             traces.append(go.Scatter(
-                x=head_x,
-                y=head_y,
-                mode="markers",
-                name=f"{name} (Pontas)",
-                marker=dict(
-                    symbol="triangle-up", # Using standard triangle
-                    size=10,
-                    color=color,
-                    angle=head_angles,
-                    standoff=0
-                ),
-                opacity=opacity, # Use function arg
-                showlegend=False,
-                hoverinfo="skip"
-            ))
+        groups.append((sub_df, name, color, symbol, opacity, size))
 
     # Logic tree for subsets
     if highlight_type and "type" in df.columns:
@@ -249,7 +346,9 @@ def plot_events_plotly(
             add_trace(df_h, highlight_type, hl_color, opacity=1.0, size=10, symbol=None)
 
     elif highlight_qualifier and "kv_qualifiers" in df.columns:
-        mask = df["kv_qualifiers"].apply(lambda x: highlight_qualifier in x)
+        # explode + eq, regrouped by row position (index may not be unique)
+        tags = df["kv_qualifiers"].reset_index(drop=True).explode()
+        mask = tags.eq(highlight_qualifier).groupby(level=0).any().reindex(range(len(df)), fill_value=False).to_numpy()
         df_h = df[mask]
         df_o = df[~mask]
         
@@ -274,12 +373,16 @@ def plot_events_plotly(
         group_col = col_map.get(color_strategy)
         
         if group_col and group_col in df.columns:
-            unique_vals = df[group_col].dropna().unique()
+            # Player keys come from the UI as "Name (Id)"; index them by raw name once
+            if color_strategy == "Jogador":
+                conf_map = {k.rsplit(" (", 1)[0]: v for k, v in layer_colors.items()}
+            else:
+                conf_map = layer_colors
             
-            for val in unique_vals:
+            # One hash partition of the frame (first-appearance order, NaN keys dropped)
+            for val, sub_df in df.groupby(group_col, sort=False, observed=True):
                 # Key for layer_colors might be the string repr
                 val_key = str(val)
-                sub_df = df[df[group_col] == val]
                 
                 if sub_df.empty: continue
                 
@@ -299,18 +402,7 @@ def plot_events_plotly(
                 # So for Player strategy, we might have a key mismatch if we just use `val`.
                 # But let's assume exact match for Type/Team for now. For Player, we try to match.
                 
-                t_conf = {}
-                if color_strategy == "Jogador":
-                    # Try to find key that contains val
-                    found_k = None
-                    for k in layer_colors.keys():
-                        if str(val) in k: # "Hulk" in "Hulk (123)"
-                            found_k = k
-                            break
-                    if found_k:
-                        t_conf = layer_colors[found_k]
-                else:
-                    t_conf = layer_colors.get(val_key, {})
+                t_conf = conf_map.get(val_key, {})
                 
                 base_c = t_conf.get("base", def_color)
                 ok_c = t_conf.get("ok", ok_color)
@@ -345,10 +437,10 @@ def plot_events_plotly(
     else:
         add_trace(df, "Eventos", def_color)
 
-    for t in traces:
-        fig.add_trace(t)
-        
-    return fig
+    traces = _build_event_traces(groups, draw_arrows, gl_threshold)
+
+    # Plain trace dicts go straight into the figure, skipping per-trace validation
+    return go.Figure(data=traces, layout=fig.layout, _validate=False)
 
 
 def plot_radar_chart(
@@ -1,140 +1,753 @@
-from typing import Optional, Tuple, Union, List
+from typing import Iterable, Optional, Tuple, Union, List
+import functools
 import re
 
+from google.cloud import bigquery
+
 # YEARS_TO_QUERY = range(2015, 2027)
 YEARS_TO_QUERY = [2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025, 2026]
 
-def _build_schedule_union(project_id: str, dataset_id: str) -> str:
+# KeyPass detection as plain substring predicates (no regex engine per row).
+# The displayName always appears quoted in the qualifiers text, either python-repr ('...') or JSON ("...").
+KEY_PASS_CONDITION = """(STRPOS(qualifiers, "'KeyPass'") > 0 OR STRPOS(qualifiers, '"KeyPass"') > 0)"""
+
+# Own goals as matched by the dynamic ranking: any spelling/case of "Own Goal" or "Gol Contra".
+# Kept as one constant regex (compiled once per query by BigQuery) so the match set stays the same.
+OWN_GOAL_CONDITION = r"REGEXP_CONTAINS(qualifiers, r'(?i)(Own\s*Goal|Gol\s*Contra)')"
+# Own goals as matched by the conversion ranking: the literal OwnGoal qualifier only.
+OWN_GOAL_TAG_CONDITION = "STRPOS(qualifiers, 'OwnGoal') > 0"
+
+# Schedule table metadata of one dataset, as loaded by bq_io.load_schedule_meta:
+# ((year, ts_col, ts_is_timestamp), ...) with ts_col 'date' | 'start_time'.
+# The builders take it as an explicit `schedule_meta` argument; being a plain tuple it is
+# hashable, so it is part of the lru_cache key of every memoized union below.
+# The years listed double as the seasons whose tables actually exist.
+# None (not loaded, or the metadata lookup failed): every year of YEARS_TO_QUERY is assumed
+# to exist and the timestamp column follows the known drift ('start_time' from 2025 on).
+ScheduleMeta = Optional[Tuple[Tuple[int, str, bool], ...]]
+
+
+def _season_years(seasons: Optional[Iterable[int]] = None, meta: ScheduleMeta = None) -> Tuple[int, ...]:
+    """
+    Seasons to emit union branches for: all of YEARS_TO_QUERY, or the requested subset.
+    With the dataset metadata (`meta`), seasons without a table are dropped too.
+    Only the listed year tables are referenced, so BQ never touches the others.
+    Empty when none of the requested seasons has a table.
+    """
+    existing = {row[0] for row in meta} if meta else None
+    available = [y for y in YEARS_TO_QUERY if existing is None or y in existing]
+    if seasons is None:
+        return tuple(available)
+    wanted = {int(s) for s in seasons}
+    return tuple(y for y in available if y in wanted)
+
+
+def _scan_years(seasons: Optional[Iterable[int]], where: str, meta: ScheduleMeta) -> Tuple[Tuple[int, ...], str]:
+    """
+    (years, where) for an inline union over `seasons`. When no requested season has a
+    table, the union still needs one branch to be valid SQL (and keep its column types):
+    it reads the newest existing season with a FALSE filter, so the result is empty.
+    """
+    years = _season_years(seasons, meta)
+    if years:
+        return years, where
+    return (_season_years(meta=meta) or tuple(YEARS_TO_QUERY))[-1:], "FALSE"
+
+
+def _schedule_ts_expr(year: int, meta: ScheduleMeta) -> str:
+    """
+    The `year` timestamp column as a TIMESTAMP; only cast where it is not one already
+    (older 'date' tables). Years missing from `meta` fall back to the known drift.
+    """
+    for row_year, ts_col, is_timestamp in meta or ():
+        if row_year == year:
+            return ts_col if is_timestamp else f"CAST({ts_col} as TIMESTAMP)"
+    ts_col = "start_time" if year >= 2025 else "date"
+    return f"CAST({ts_col} as TIMESTAMP)"
+
+
+@functools.lru_cache(maxsize=32)
+def _schedule_union_sql(
+    project_id: str, dataset_id: str, years: Tuple[int, ...], where: str, meta: ScheduleMeta
+) -> str:
     """
     Builds UNION ALL for Schedule tables, normalizing columns.
     Old tables might use 'date', new ones 'start_time'.
     """
-    subqueries = []
-    for year in YEARS_TO_QUERY:
-        # Check column availability logic is tricky in pure SQL string generation without checking schema first.
-        # But we saw from debug that 2017 has 'date' (TIMESTAMP) and 2025 has 'start_time' (TIMESTAMP).
-        # We need to normalize to 'start_time'.
-        # 2017: date, game_id, home_team, away_team, home_score, away_score, status
-        # 2025: start_time, game_id, ...
-        
-        # Heuristic based on year:
-        # Years < 2020 might use 'date'. Let's assume standard names.
-        # Actually safer way: select both, alias correctly. BQ will error if column doesn't exist.
-        # Wait, if I select 'date' from 2025 table it errors if it doesn't exist.
-        
-        # Hack solution: Since we know the drift, we can use exception or just listing.
-        # Better: use `SELECT * EXCEPT(...)` or just SELECT common ones?
-        # NO, 'date' is missing in 2025. 'start_time' is missing in 2017.
-        
-        # We need per-year logic.
-        if year <= 2023: # Assumption based on usually these datasets change recently. Or just 2025 changed.
-            # Let's try to be generic. 
-            # If we really want to be robust we would check schema.
-            # But let's assume 'date' is used in older, 'start_time' in newer.
-            # Let's try to use 'date' if available, else 'start_time' logic? No SQL doesn't work that way.
-            pass
-        
-    # Since I cannot check schema at runtime efficiently here without slowing down, 
-    # I will rely on the pattern.
-    # Pattern seen: 2017 has 'date', 2025 has 'start_time'.
-    # Let's split 2025 from others?
-    # Or checking the debug output closer (which I can't fully see, but it showed mismatches).
-    
-    # Let's try to query metadata? No.
-    # Let's just output the explicit columns for 2025 and explicit for others.
-    # But I don't know the exact year cut-off.
-    
-    # Safe fallback: Use `SAFE_CAST(NULL as TIMESTAMP)`? No the column selection fails.
-    
-    # Actually, the user report says: "Column 41...". 
-    # The problem of SELECT * is exactly this.
-    # If I explicitly select, I must know the column name.
-    
-    # Let's use the simplest valid subsets.
-    # Required: game_id, home_team, away_team, home_score, away_score, TIMESTAMP (date/start_time), status.
-    
-    # I will generate a query that tries to be smart. 
-    # Or I can just inspect schemas right now for all of them? No too fast.
-    
-    # Let's assume:
-    # 2015-2023: Use 'date'
-    # 2024-2025: Use 'start_time' (Common in Opta/Better data updates).
-    
-    # Correction: The previous debug showed 2017 had 'date' (TIMESTAMP). 2025 had 'start_time' (TIMESTAMP).
-    # I will iterate and define columns based on year.
-    pass
-
-    subqueries = []
-    for year in YEARS_TO_QUERY:
-        # Based on typical Opta/DataProvider schemas:
-        # Based on typical Opta/DataProvider schemas:
-        # Adjusted: 2024 often still uses 'date'. 2025+ uses 'start_time'.
-        if year >= 2025:
-            ts_col = "start_time"
-        else:
-            ts_col = "date"
-            
-        subqueries.append(f"""
+    # The timestamp column per year comes from `meta` (INFORMATION_SCHEMA when loaded).
+    # Not a wildcard scan like the events: date/start_time differ per year, and a wildcard
+    # only exposes the newest table's columns, so the old 'date' column would be lost.
+    if where:
+        # Filter inside every branch, so each year's scan is pruned before the union
+        return " UNION ALL ".join(
+            f"SELECT * FROM ({_schedule_year_sql(project_id, dataset_id, year, meta)}) WHERE {where}"
+            for year in years
+        )
+    return " UNION ALL ".join(_schedule_year_sql(project_id, dataset_id, year, meta) for year in years)
+
+
+def _schedule_year_sql(project_id: str, dataset_id: str, year: int, meta: ScheduleMeta) -> str:
+    """
+    One season of the schedule, with the normalized column set.
+    """
+    return f"""
             SELECT 
                 game_id, 
                 {year} as season, 
-                CAST({ts_col} as TIMESTAMP) as match_date, 
+                {_schedule_ts_expr(year, meta)} as match_date, 
                 home_team, 
                 away_team, 
                 home_score, 
                 away_score, 
                 CAST(status as STRING) as status 
             FROM `{project_id}.{dataset_id}.schedule_brasileirao_serie_a_{year}`
-        """)
-    return " UNION ALL ".join(subqueries)
+        """
+
+
+def _schedule_top_k_union(project_id: str, dataset_id: str, where: str, k: str, meta: ScheduleMeta = None) -> str:
+    """
+    Per-season top-k (by match_date DESC, after `where`) merged with UNION ALL.
+    A global ORDER BY ... LIMIT k over the result then only sorts len(YEARS) * k rows.
+    `k` is SQL text (a literal or a query parameter such as @limit).
+    """
+    years, where = _scan_years(None, where, meta)
+    return _schedule_top_k_union_sql(project_id, dataset_id, years, where, k, meta)
+
+
+@functools.lru_cache(maxsize=32)
+def _schedule_top_k_union_sql(
+    project_id: str, dataset_id: str, years: Tuple[int, ...], where: str, k: str, meta: ScheduleMeta
+) -> str:
+    return " UNION ALL ".join(
+        f"""(
+            SELECT * FROM ({_schedule_year_sql(project_id, dataset_id, year, meta)})
+            WHERE {where}
+            ORDER BY match_date DESC
+            LIMIT {k}
+        )"""
+        for year in years
+    )
+
 
+# 2026 table has 30 cols, 2015 has 27. Must select explicit shared columns: the wildcard
+# takes the newest table's schema and older tables read NULL for the columns they lack.
+# A shared column must also have the same type in every year table: the wildcard reads
+# each table with the newest schema and fails on a type mismatch (a CAST in the SELECT
+# comes too late). get_events_column_drift_query lists such columns.
+# name -> select expression
+EVENT_COLUMNS = {
+    "game_id": "game_id", "team": "team", "player": "player", "player_id": "player_id",
+    "type": "type", "outcome_type": "outcome_type", "qualifiers": "qualifiers",
+    "expanded_minute": "expanded_minute", "period": "period",
+    "x": "x", "y": "y", "end_x": "end_x", "end_y": "end_y",
+    "is_shot": "is_shot", "related_player_id": "related_player_id",
+}
 
-def _build_events_union(project_id: str, dataset_id: str) -> str:
+
+@functools.lru_cache(maxsize=32)
+def _events_union_sql(
+    project_id: str,
+    dataset_id: str,
+    years: Tuple[int, ...] = tuple(YEARS_TO_QUERY),
+    where: str = "",
+    cols: Tuple[str, ...] = None
+) -> str:
     """
-    Builds UNION ALL for Events tables, properly Aliasing/Casting.
+    All seasons of events in one wildcard-table scan, properly Aliasing/Casting.
     Required: game_id, team, player, type, outcome_type, is_shot, x, y, end_x, end_y
+    `cols` narrows the projection (names from EVENT_COLUMNS); season is always included.
     """
-    # events also need season if we ever query them directly for season stats
-    # 2026 table has 30 cols, 2015 has 27. Must select explicit shared columns to avoid UNION ALL error.
-    cols = [
-        "game_id", "team", "player", "player_id", 
-        "type", "outcome_type", "qualifiers", 
-        "expanded_minute", "period", 
-        "x", "y", "end_x", "end_y", 
-        "is_shot", "related_player_id"
-    ]
-    cols_str = ", ".join(cols)
-    return " UNION ALL ".join([f"SELECT {cols_str}, {year} as season FROM `{project_id}.{dataset_id}.eventos_brasileirao_serie_a_{year}`" for year in YEARS_TO_QUERY])
+    cols_str = ", ".join(EVENT_COLUMNS[c] for c in (cols or EVENT_COLUMNS))
+    # Explicit suffix list (not BETWEEN): prunes to exactly these year tables and never
+    # matches stray tables sharing the prefix (backups, etc.).
+    suffixes = ", ".join(f"'{year}'" for year in years)
+    # `where` (raw column names) sits next to the suffix filter, inside the scan itself
+    extra = f" AND ({where})" if where else ""
+    return f"""
+            SELECT {cols_str}, CAST(_TABLE_SUFFIX AS INT64) as season
+            FROM `{project_id}.{dataset_id}.eventos_brasileirao_serie_a_*`
+            WHERE _TABLE_SUFFIX IN ({suffixes}){extra}
+        """
+
+
+# The inline unions above are deterministic in their (hashable) arguments, so they are
+# memoized: the per-year loop runs once per process, not once per query builder call.
+# The get_*_query builders stay uncached: they take lists (teams, columns) and read the
+# module switches below; their results are cached per page with st.cache_data.
+
+# Where the all-seasons schedule/events are read from:
+#   "inline" -> SQL generated into every query (default; needs nothing in BQ)
+#   "views"  -> column-normalized views (get_create_union_views_ddl)
+#   "tables" -> season-partitioned roll-up tables (get_create_union_tables_ddl, rebuilt nightly)
+# Views still expand to the union at plan time; the tables are what let BQ prune by season.
+UNION_SOURCE = "inline"
+SCHEDULE_VIEW = "v_all_schedule"
+EVENTS_VIEW = "v_all_events"
+SCHEDULE_TABLE = "schedule_all"
+EVENTS_TABLE = "eventos_all"
+
+
+def _union_object(kind: str) -> Optional[str]:
+    """
+    Name of the view/table that replaces the inline union, or None for "inline".
+    """
+    if UNION_SOURCE == "views":
+        return SCHEDULE_VIEW if kind == "schedule" else EVENTS_VIEW
+    if UNION_SOURCE == "tables":
+        return SCHEDULE_TABLE if kind == "schedule" else EVENTS_TABLE
+    return None
+
+
+def _season_filter(seasons: Optional[Iterable[int]], where: str = "", meta: ScheduleMeta = None) -> str:
+    """
+    WHERE clause restricting a roll-up table/view to `seasons` and `where` (empty when neither).
+    """
+    conds = []
+    if seasons is not None:
+        years = _season_years(seasons, meta)
+        conds.append(f"season IN ({', '.join(str(y) for y in years)})" if years else "FALSE")
+    if where:
+        conds.append(f"({where})")
+    return f" WHERE {' AND '.join(conds)}" if conds else ""
+
+
+def _build_schedule_union(
+    project_id: str,
+    dataset_id: str,
+    seasons: Optional[Iterable[int]] = None,
+    where: str = "",
+    meta: ScheduleMeta = None
+) -> str:
+    """
+    Schedule source: the roll-up table/view, or the inline UNION ALL.
+    With `seasons`, only those seasons are read (partition filter / fewer branches).
+    `where` (normalized column names) is applied inside each per-year branch.
+    """
+    obj = _union_object("schedule")
+    if obj:
+        return f"SELECT * FROM `{project_id}.{dataset_id}.{obj}`{_season_filter(seasons, where, meta)}"
+    years, where = _scan_years(seasons, where, meta)
+    return _schedule_union_sql(project_id, dataset_id, years, where, meta)
+
+
+def _build_match_dates(
+    project_id: str,
+    dataset_id: str,
+    seasons: Optional[Iterable[int]] = None,
+    extra: Tuple[str, ...] = (),
+    where: str = "",
+    meta: ScheduleMeta = None
+) -> str:
+    """
+    Narrow schedule source: only (game_id, match_date, season) plus `extra` columns
+    (names shared by every year, e.g. home_team), so the scan reads just those columns
+    per table instead of the full normalized schedule.
+    `where` (over those output columns) is applied inside each per-year branch.
+    """
+    obj = _union_object("schedule")
+    if obj:
+        cols = "".join(f", {c}" for c in extra)
+        return f"SELECT game_id, match_date, season{cols} FROM `{project_id}.{dataset_id}.{obj}`{_season_filter(seasons, where, meta)}"
+    years, where = _scan_years(seasons, where, meta)
+    return _match_dates_sql(project_id, dataset_id, years, tuple(extra), where, meta)
+
+
+@functools.lru_cache(maxsize=32)
+def _match_dates_sql(
+    project_id: str, dataset_id: str, years: Tuple[int, ...], extra: Tuple[str, ...], where: str, meta: ScheduleMeta
+) -> str:
+    cols = "".join(f", {c}" for c in extra)
+    branches = (
+        f"SELECT game_id, {_schedule_ts_expr(year, meta)} as match_date, {year} as season{cols} "
+        f"FROM `{project_id}.{dataset_id}.schedule_brasileirao_serie_a_{year}`"
+        for year in years
+    )
+    if where:
+        # match_date is an alias in the branch, so filter on the branch output
+        branches = (f"SELECT * FROM ({branch}) WHERE {where}" for branch in branches)
+    return " UNION ALL ".join(branches)
+
+
+def _build_events_union(
+    project_id: str,
+    dataset_id: str,
+    seasons: Optional[Iterable[int]] = None,
+    where: str = "",
+    cols: Optional[Tuple[str, ...]] = None,
+    meta: ScheduleMeta = None
+) -> str:
+    """
+    Events source: the roll-up table/view, or the inline UNION ALL.
+    With `seasons`, only those seasons are read (partition filter / fewer branches).
+    `where` (e.g. "team = @team") is applied in the scan, before any CTE consumer.
+    `cols` projects only those event columns (plus season); wide ones such as
+    qualifiers are then never read.
+    """
+    obj = _union_object("events")
+    if obj:
+        projection = ", ".join(tuple(cols) + ("season",)) if cols else "*"
+        return f"SELECT {projection} FROM `{project_id}.{dataset_id}.{obj}`{_season_filter(seasons, where, meta)}"
+    years, where = _scan_years(seasons, where, meta)
+    return _events_union_sql(project_id, dataset_id, years, where, tuple(cols) if cols else None)
+
+
+def get_create_union_views_ddl(project_id: str, dataset_id: str, schedule_meta: ScheduleMeta = None) -> str:
+    """
+    DDL (run once, offline) for the all-seasons views. They carry the same
+    normalization as the inline unions (start_time/date drift, shared event columns).
+    Re-run when a season is added to YEARS_TO_QUERY.
+    """
+    years, where = _scan_years(None, "", schedule_meta)
+    return f"""
+        CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.{SCHEDULE_VIEW}` AS
+        {_schedule_union_sql(project_id, dataset_id, years, where, schedule_meta)};
+
+        CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.{EVENTS_VIEW}` AS
+        {_events_union_sql(project_id, dataset_id, years, where)};
+    """
+
+
+def get_create_union_tables_ddl(project_id: str, dataset_id: str, schedule_meta: ScheduleMeta = None) -> str:
+    """
+    DDL for the all-seasons roll-up tables (CTAS, integer-range partitioned by season).
+    BigQuery materialized views cannot contain UNION ALL, so these are plain tables:
+    rebuild them on a schedule (nightly) and whenever YEARS_TO_QUERY changes.
+    """
+    first, last = min(YEARS_TO_QUERY), max(YEARS_TO_QUERY) + 1
+    partition = f"PARTITION BY RANGE_BUCKET(season, GENERATE_ARRAY({first}, {last}, 1))"
+    years, where = _scan_years(None, "", schedule_meta)
+    return f"""
+        CREATE OR REPLACE TABLE `{project_id}.{dataset_id}.{SCHEDULE_TABLE}`
+        {partition}
+        AS {_schedule_union_sql(project_id, dataset_id, years, where, schedule_meta)};
+
+        CREATE OR REPLACE TABLE `{project_id}.{dataset_id}.{EVENTS_TABLE}`
+        {partition}
+        -- team/type/player: the @teams / @players lookups and the ranking type filters prune
+        -- blocks (same order as the per-season tables); game_id last for the match joins
+        CLUSTER BY team, type, player, game_id
+        AS {_events_union_sql(project_id, dataset_id, years, where)};
+    """
+
+
+def get_cluster_events_tables_ddl(
+    project_id: str,
+    dataset_id: str,
+    seasons: Optional[Iterable[int]] = None,
+    schedule_meta: ScheduleMeta = None,
+) -> str:
+    """
+    One-off DDL that rewrites each per-season events table in place, clustered by
+    team, type, player, so the wildcard reads (@team / @player lookups, type filters)
+    prune storage blocks. The tables hold one season each, so they are not partitioned;
+    the schedule tables (~380 rows/season) are too small for clustering to matter.
+    Empty when none of `seasons` has a table (nothing to rewrite).
+    """
+    return "\n".join(
+        f"""
+        CREATE OR REPLACE TABLE `{project_id}.{dataset_id}.eventos_brasileirao_serie_a_{year}`
+        CLUSTER BY team, type, player
+        AS SELECT * FROM `{project_id}.{dataset_id}.eventos_brasileirao_serie_a_{year}`;"""
+        for year in _season_years(seasons, meta=schedule_meta)
+    )
+
+
+# Nightly per-match aggregates (get_create_stats_rollups_ddl). When on, get_match_stats_query
+# and get_player_rankings_query read them instead of re-aggregating raw events, the
+# assist path of get_dynamic_ranking_query reads the player_id -> name map, and the
+# match-count / clean-sheet queries read the per-(team, match) schedule rows.
+USE_STATS_ROLLUPS = False
+EVENT_STATS_ROLLUP = "event_stats_rollup"
+PLAYER_MATCH_ROLLUP = "player_match_rollup"
+PLAYER_NAMES_TABLE = "player_names"
+TEAM_MATCH_ROLLUP = "team_match_rollup"
+
+
+def get_create_stats_rollups_ddl(project_id: str, dataset_id: str, schedule_meta: ScheduleMeta = None) -> str:
+    """
+    DDL for the per-match roll-ups (season-partitioned, clustered on the usual filters).
+    Built from the current UNION_SOURCE; rebuild nightly, after the union tables.
+    """
+    first, last = min(YEARS_TO_QUERY), max(YEARS_TO_QUERY) + 1
+    partition = f"PARTITION BY RANGE_BUCKET(season, GENERATE_ARRAY({first}, {last}, 1))"
+    match_dates = _build_match_dates(project_id, dataset_id, meta=schedule_meta)
+    events_union = _build_events_union(project_id, dataset_id, meta=schedule_meta)
+    return f"""
+        CREATE OR REPLACE TABLE `{project_id}.{dataset_id}.{EVENT_STATS_ROLLUP}`
+        {partition}
+        CLUSTER BY team, match_id
+        AS {_team_event_stats_sql(f"({events_union})")};
+
+        CREATE OR REPLACE TABLE `{project_id}.{dataset_id}.{PLAYER_MATCH_ROLLUP}`
+        {partition}
+        CLUSTER BY player, team
+        AS {_player_match_rows_sql(match_dates, events_union)};
+
+        -- One name per player_id (a DISTINCT on (id, name) would duplicate renamed players)
+        CREATE OR REPLACE TABLE `{project_id}.{dataset_id}.{PLAYER_NAMES_TABLE}`
+        AS
+        SELECT player_id, ANY_VALUE(player) as player
+        FROM ({events_union})
+        WHERE player_id IS NOT NULL AND player IS NOT NULL
+        GROUP BY player_id;
+
+        -- Schedule unpivoted to one row per (team, match), with goals for/against
+        CREATE OR REPLACE TABLE `{project_id}.{dataset_id}.{TEAM_MATCH_ROLLUP}`
+        {partition}
+        CLUSTER BY team
+        AS
+        SELECT s.season, t.team, s.game_id, s.match_date, t.goals_for, t.goals_against
+        FROM ({_build_schedule_union(project_id, dataset_id, meta=schedule_meta)}) s,
+            UNNEST([
+                STRUCT(s.home_team as team, s.home_score as goals_for, s.away_score as goals_against),
+                STRUCT(s.away_team as team, s.away_score as goals_for, s.home_score as goals_against)
+            ]) t
+        WHERE t.team IS NOT NULL;
+    """
+
+
+def _effective_team_sql(own_goal_condition: str, against: bool = False) -> str:
+    """
+    effective_team CASE over `all_events e` joined to the per-game team map `m`.
+    "pro": swaps the team of own goals so the goal counts for the beneficiary (opponent of the scorer).
+    "against": every event is credited to the opponent, except own goals, which already
+    count against the team that scored them.
+    """
+    opponent = """
+                CASE 
+                    WHEN e.team = m.home_team THEN m.away_team 
+                    WHEN e.team = m.away_team THEN m.home_team 
+                    ELSE e.team
+                END"""
+    if against:
+        return f"""
+        CASE
+            WHEN e.type = 'Goal' AND {own_goal_condition} THEN e.team
+            ELSE{opponent}
+        END as effective_team
+    """
+    return f"""
+        CASE 
+            WHEN e.type = 'Goal' AND {own_goal_condition} THEN{opponent}
+            ELSE e.team
+        END as effective_team
+    """
+
+
+# Logic for Effective Team (dynamic ranking / events_enhanced table)
+_EFFECTIVE_TEAM_SQL = _effective_team_sql(OWN_GOAL_CONDITION)
+# Conversion ranking, per perspective (literal OwnGoal tag, as that query always matched)
+_CONVERSION_EFFECTIVE_TEAM_SQL = {
+    "pro": _effective_team_sql(OWN_GOAL_TAG_CONDITION),
+    "against": _effective_team_sql(OWN_GOAL_TAG_CONDITION, against=True),
+}
+
+# Events + weighted ghost goals + effective_team, as CTEs over `all_events` and
+# `match_metadata` (needs home/away scores). Used inline by get_dynamic_ranking_query
+# and materialized as EVENTS_ENHANCED_TABLE by get_create_events_enhanced_ddl.
+_EVENTS_ENHANCED_CTES = f"""
+    -- Ghost Goal Logic: Inject missing goals found in Schedule but missing in Events
+    existing_goals AS (
+        SELECT game_id, team, count(*) as goals
+        FROM all_events
+        WHERE type = 'Goal'
+        GROUP BY 1, 2
+    ),
+    
+    missing_goals AS (
+        SELECT 
+            m.game_id, 
+            m.season,
+            m.home_team, 
+            m.away_team,
+            (m.home_score - IFNULL(eh.goals, 0)) as home_diff,
+            (m.away_score - IFNULL(ea.goals, 0)) as away_diff
+        FROM match_metadata m
+        LEFT JOIN existing_goals eh ON m.game_id = eh.game_id AND eh.team = m.home_team
+        LEFT JOIN existing_goals ea ON m.game_id = ea.game_id AND ea.team = m.away_team
+        WHERE (m.home_score > IFNULL(eh.goals, 0)) OR (m.away_score > IFNULL(ea.goals, 0))
+    ),
+    
+    -- One ghost row per (game, team) carrying the number of missing goals as its
+    -- weight, instead of exploding N identical rows; filtered_events sums the weights
+    ghost_events AS (
+        -- Home Ghosts
+        SELECT 
+            game_id, 
+            home_team as team, 
+            CAST(NULL as STRING) as player, 
+            CAST(NULL as FLOAT64) as player_id,
+            'Goal' as type, 
+            'Successful' as outcome_type, 
+            '[]' as qualifiers,
+            90 as expanded_minute, 
+            'FullTime' as period,
+            50.0 as x, 50.0 as y, 
+            50.0 as end_x, 50.0 as end_y,
+            CAST(NULL as BOOL) as is_shot,
+            CAST(NULL as FLOAT64) as related_player_id,
+            season,
+            home_diff as event_weight
+        FROM missing_goals
+        WHERE home_diff > 0
+        
+        UNION ALL
+        
+        -- Away Ghosts
+        SELECT 
+            game_id, 
+            away_team as team, 
+             CAST(NULL as STRING) as player, 
+            CAST(NULL as FLOAT64) as player_id,
+            'Goal' as type, 
+            'Successful' as outcome_type, 
+            '[]' as qualifiers,
+            90 as expanded_minute, 
+            'FullTime' as period,
+            50.0 as x, 50.0 as y, 
+            50.0 as end_x, 50.0 as end_y,
+            CAST(NULL as BOOL) as is_shot,
+            CAST(NULL as FLOAT64) as related_player_id,
+            season,
+            away_diff as event_weight
+        FROM missing_goals
+        WHERE away_diff > 0
+    ),
+    
+    all_events_fixed AS (
+        SELECT *, 1 as event_weight FROM all_events
+        UNION ALL
+        SELECT * FROM ghost_events
+    ),
+    
+    -- Only the two team names are needed per game: a few thousand narrow rows that
+    -- BigQuery broadcasts to the events scan instead of shuffling the events
+    match_teams_map AS (
+        SELECT game_id, home_team, away_team FROM match_metadata
+    ),
+    
+    events_enhanced AS (
+        SELECT 
+            e.*,
+            {_EFFECTIVE_TEAM_SQL}
+        FROM all_events_fixed e
+        JOIN match_teams_map m ON e.game_id = m.game_id
+    )
+"""
+
+
+# Nightly materialization of _EVENTS_ENHANCED_CTES (get_create_events_enhanced_ddl). When on,
+# get_dynamic_ranking_query reads it instead of rebuilding ghosts/effective_team per query.
+USE_EVENTS_ENHANCED_TABLE = False
+EVENTS_ENHANCED_TABLE = "events_enhanced"
 
 
-def get_total_matches_query(project_id: str, dataset_id: str) -> str:
-    schedule_union = _build_schedule_union(project_id, dataset_id)
+def get_create_events_enhanced_ddl(project_id: str, dataset_id: str, schedule_meta: ScheduleMeta = None) -> str:
+    """
+    DDL for the events_enhanced table (season-partitioned, clustered on the ranking filters).
+    Built from the current UNION_SOURCE; rebuild nightly, after the union tables.
+    """
+    first, last = min(YEARS_TO_QUERY), max(YEARS_TO_QUERY) + 1
+    return f"""
+        CREATE OR REPLACE TABLE `{project_id}.{dataset_id}.{EVENTS_ENHANCED_TABLE}`
+        PARTITION BY RANGE_BUCKET(season, GENERATE_ARRAY({first}, {last}, 1))
+        CLUSTER BY effective_team, type, player
+        AS
+        WITH all_schedule AS (
+            {_build_schedule_union(project_id, dataset_id, meta=schedule_meta)}
+        ),
+        all_events AS (
+            {_build_events_union(project_id, dataset_id, meta=schedule_meta)}
+        ),
+        match_metadata AS (
+            SELECT game_id, season, home_team, away_team, home_score, away_score
+            FROM all_schedule
+        ),
+        {_EVENTS_ENHANCED_CTES}
+        SELECT * FROM events_enhanced
+    """
+
+
+def _sql_string(value) -> str:
+    """
+    BigQuery string literal for `value`, with quotes/backslashes escaped
+    (names like O'Neill stay valid SQL and cannot close the literal).
+    """
+    escaped = str(value).replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{escaped}'"
+
+
+def _sql_in(column: str, values) -> str:
+    """
+    `column = 'v'` for a single string, `column IN ('a', 'b')` for a list; values are escaped.
+    """
+    if isinstance(values, str):
+        return f"{column} = {_sql_string(values)}"
+    return f"{column} IN ({', '.join(_sql_string(v) for v in values)})"
+
+
+def _string_array_param(name: str, values) -> bigquery.ArrayQueryParameter:
+    """
+    `values` (a str or a list) bound as the ARRAY<STRING> query parameter @name,
+    used as `column IN UNNEST(@name)`.
+    """
+    if isinstance(values, str):
+        values = [values]
+    return bigquery.ArrayQueryParameter(name, "STRING", list(values))
+
+
+def _date_range_where(column: str, date_range) -> Tuple[Optional[str], list]:
+    """
+    `column` (a TIMESTAMP) from date_range[0] on, and up to date_range[1] when given,
+    with the dates bound as @start_date/@end_date. (None, []) without a range.
+    """
+    if not date_range:
+        return None, []
+    params = [bigquery.ScalarQueryParameter("start_date", "DATE", date_range[0])]
+    clause = f"{column} >= TIMESTAMP(@start_date)"
+    # Handle tuple of 1 or 2
+    if len(date_range) > 1:
+        params.append(bigquery.ScalarQueryParameter("end_date", "DATE", date_range[1]))
+        clause += f" AND {column} <= TIMESTAMP(@end_date)"
+    return clause, params
+
+
+def _date_range_seasons(date_range) -> Optional[List[int]]:
+    """
+    Seasons that can hold matches inside date_range (None = all), so the date filters
+    also drop whole per-year branches / season partitions. A season can run into the
+    next calendar year (2020 ended in Feb 2021), hence the year before the start.
+    """
+    if not date_range:
+        return None
+    first = date_range[0].year - 1
+    last = date_range[1].year if len(date_range) > 1 else max(YEARS_TO_QUERY)
+    seasons = [y for y in YEARS_TO_QUERY if first <= y <= last]
+    return seasons or None
+
+
+# UI outcome labels (pt-BR) -> outcome_type values stored in the events tables
+_OUTCOME_MAP = {"Sucesso": "Successful", "Falha": "Unsuccessful"}
+
+
+@functools.lru_cache(maxsize=256)
+def _qualifier_pattern(quals: Tuple[str, ...]) -> str:
+    """
+    Escaped `a|b|c` alternation for REGEXP_CONTAINS over the qualifiers column.
+    Callers pass a sorted tuple so the same selection in any order hits the cache.
+    """
+    return "|".join(re.escape(q) for q in quals)
+
+
+def _as_list(values) -> list:
+    return [values] if isinstance(values, str) else list(values or [])
+
+
+# Whole-word column swaps between team and effective_team (home_team, @teams stay intact)
+_TEAM_RE = re.compile(r"\bteam\b")
+_EFFECTIVE_TEAM_RE = re.compile(r"\beffective_team\b")
+
+# Event columns _ranking_filter_where and the ranking groupings can reference
+RANKING_EVENT_COLUMNS = ("game_id", "team", "player", "type", "outcome_type", "qualifiers")
+
+# (column, "all" label, value mapping) for the plain IN filters of the ranking builders
+_EVENT_IN_FILTERS = (
+    ("type", "Todos", {}),
+    ("outcome_type", "Todos", _OUTCOME_MAP),
+)
+
+
+def _ranking_filter_where(event_types, outcomes, qualifiers, teams, players) -> Tuple[str, list]:
+    """
+    WHERE text (over events with effective_team) and params for the ranking filters.
+    Each filter takes a str or a list; its "Todos" label disables it.
+    Teams/players are bound as @teams/@players (see _string_array_param).
+    """
+    where_clauses = ["1=1"]
+    for (column, all_label, mapping), values in zip(_EVENT_IN_FILTERS, (event_types, outcomes)):
+        values = _as_list(values)
+        if values and all_label not in values:
+            where_clauses.append(_sql_in(column, [mapping.get(v, v) for v in values]))
+
+    # Qualifiers: regex OR over the qualifiers text
+    quals = tuple(sorted(q for q in _as_list(qualifiers) if q))
+    if quals and "Todos (Qualquer)" not in quals:
+        where_clauses.append(f"REGEXP_CONTAINS(qualifiers, {_sql_string(_qualifier_pattern(quals))})")
+
+    params = []
+    players, teams = _as_list(players), _as_list(teams)
+    if players and "Todos" not in players:
+        where_clauses.append("player IN UNNEST(@players)")
+        params.append(_string_array_param("players", players))
+    if teams and "Todos" not in teams:
+        where_clauses.append("effective_team IN UNNEST(@teams)")
+        params.append(_string_array_param("teams", teams))
+
+    return " AND ".join(where_clauses), params
+
+
+def _select_columns(query: str, columns: Optional[List[str]] = None) -> str:
+    """
+    Projects the result of `query` down to `columns` (all columns if None),
+    so BigQuery only reads/returns what the caller actually uses.
+    """
+    if not columns:
+        return query
+    return f"SELECT {', '.join(columns)} FROM ({query})"
+
+
+def get_total_matches_query(
+    project_id: str,
+    dataset_id: str,
+    exact: bool = False,
+    schedule_meta: ScheduleMeta = None,
+) -> str:
+    """
+    Headline match count. Approximate (HyperLogLog) by default; `exact=True` for COUNT(DISTINCT).
+    """
+    schedule_union = _build_schedule_union(project_id, dataset_id, meta=schedule_meta)
+    count = "COUNT(DISTINCT game_id)" if exact else "APPROX_COUNT_DISTINCT(game_id)"
     return f"""
         WITH all_schedule AS (
             {schedule_union}
         )
-        SELECT COUNT(DISTINCT game_id) as total
+        SELECT {count} as total
         FROM all_schedule
         WHERE status IS NOT NULL
     """
 
-def get_total_events_query(project_id: str, dataset_id: str) -> str:
-    # Use * for events, assuming consistency or BQ handles name matching if not *? 
-    # Union * requires strict type/order match.
-    # Risky.
-    # Let's try to be specific.
-    events_union = _build_events_union(project_id, dataset_id)
+def get_total_events_query(project_id: str, dataset_id: str, schedule_meta: ScheduleMeta = None) -> str:
+    """
+    Total events across YEARS_TO_QUERY from the dataset's __TABLES__ metadata
+    (row_count per table), so no event table is scanned.
+    """
+    tables = ", ".join(f"'eventos_brasileirao_serie_a_{year}'" for year in _season_years(meta=schedule_meta))
     return f"""
-        WITH all_events AS (
-            {events_union}
-        )
-        SELECT COUNT(*) as total
-        FROM all_events
+        SELECT IFNULL(SUM(row_count), 0) as total
+        FROM `{project_id}.{dataset_id}.__TABLES__`
+        WHERE {f"table_id IN ({tables})" if tables else "FALSE"}
     """
 
-def get_recent_matches_query(project_id: str, dataset_id: str, limit: int = 5) -> str:
-    schedule_union = _build_schedule_union(project_id, dataset_id)
-    return f"""
+def get_recent_matches_query(
+    project_id: str,
+    dataset_id: str,
+    limit: int = 5,
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
+    """
+    Returns (sql, params): `limit` is bound as @limit.
+    """
+    finished = "(status = '2' OR status = 'Finished') AND home_score IS NOT NULL" # Normalized status
+    if _union_object("schedule"):
+        # Same per-season top-k on the roll-up table/view, fused into the scan with QUALIFY
+        schedule_union = f"""
+            {_build_schedule_union(project_id, dataset_id, where=finished, meta=schedule_meta)}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY season ORDER BY match_date DESC) <= @limit
+        """
+    else:
+        # Each season contributes at most @limit rows before the global sort
+        schedule_union = _schedule_top_k_union(project_id, dataset_id, finished, "@limit", meta=schedule_meta)
+    sql = f"""
         WITH all_schedule AS (
             {schedule_union}
         )
@@ -146,22 +759,125 @@ def get_recent_matches_query(project_id: str, dataset_id: str, limit: int = 5) -
             home_score,
             away_score
         FROM all_schedule
-        WHERE status = '2' OR status = 'Finished' -- Normalized status
-        AND home_score IS NOT NULL
         ORDER BY match_date DESC
-        LIMIT {limit}
+        LIMIT @limit
+    """
+    return sql, [bigquery.ScalarQueryParameter("limit", "INT64", int(limit))]
+
+
+def get_home_bundle_query(
+    project_id: str,
+    dataset_id: str,
+    limit: int = 5,
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
+    """
+    Returns (sql, params): the schedule-based home-page tiles in one job and one row:
+    total_matches and recent_matches (ARRAY<STRUCT> of the recent matches query, newest first).
+    The __TABLES__ event total stays a separate query (get_total_events_query), so a
+    metadata permission error only blanks its own tile.
     """
+    recent_sql, params = get_recent_matches_query(project_id, dataset_id, limit, schedule_meta)
+    # The derived table's ORDER BY does not carry into the array: sort the ARRAY's own SELECT
+    sql = f"""
+        SELECT
+            ({get_total_matches_query(project_id, dataset_id, schedule_meta=schedule_meta)}) as total_matches,
+            ARRAY(
+                SELECT AS STRUCT * FROM ({recent_sql}) ORDER BY match_date DESC
+            ) as recent_matches
+    """
+    return sql, params
+
+
+# Event types counted by _team_event_stats_sql. Shots (is_shot) and key passes
+# (KEY_PASS_CONDITION, any event type) are matched by their own predicates.
+STATS_EVENT_TYPES = (
+    "Pass", "Goal", "SavedShot", "Tackle", "Interception", "Ball Recovery", "Clearance", "Save", "Foul"
+)
+
 
-def get_match_stats_query(project_id: str, dataset_id: str) -> str:
-    schedule_union = _build_schedule_union(project_id, dataset_id)
+def _team_event_stats_sql(events_from: str) -> str:
+    """
+    Per (match, team, season) event counters over `events_from` (a source plus optional WHERE).
+    Shared by get_match_stats_query and the event_stats roll-up table.
+    """
+    # Note: assists are counted from related_player_id on Goals, not from qualifiers
+    return f"""
+        SELECT
+            game_id as match_id,
+            team,
+            season,
+            COUNTIF(is_pass) as total_passes,
+            COUNTIF(is_pass AND is_successful) as successful_passes,
+            
+            COUNTIF(is_shot) as total_shots,
+            COUNTIF(is_goal) as goals_from_events,
+            COUNTIF(is_on_target) as shots_on_target,
+            
+            -- Defensive / Other
+            COUNTIF(is_tackle) as tackles,
+            COUNTIF(is_interception) as interceptions,
+            COUNTIF(is_recovery) as recoveries,
+            COUNTIF(is_clearance) as clearances,
+            COUNTIF(is_save) as saves,
+            COUNTIF(is_foul) as fouls,
+            
+            -- Qualifiers (String Parsing)
+            -- Assist: Count Goals where related_player_id is set (Implicit Team Assist)
+            COUNTIF(is_goal AND has_related_player) as assists,
+            COUNTIF(is_key_pass) as key_passes
+        FROM (
+            -- One-hot flags: each type predicate is evaluated once per row, then only booleans are aggregated
+            SELECT
+                game_id,
+                team,
+                season,
+                type = 'Pass' as is_pass,
+                outcome_type = 'Successful' as is_successful,
+                is_shot = true as is_shot,
+                type = 'Goal' as is_goal,
+                type IN ('SavedShot', 'Goal') as is_on_target,
+                type = 'Tackle' as is_tackle,
+                type = 'Interception' as is_interception,
+                type = 'Ball Recovery' as is_recovery,
+                type = 'Clearance' as is_clearance,
+                type = 'Save' as is_save,
+                type = 'Foul' as is_foul,
+                related_player_id IS NOT NULL as has_related_player,
+                {KEY_PASS_CONDITION} as is_key_pass
+            FROM (SELECT * FROM {events_from})
+            -- Only rows some counter can match reach the GROUP BY shuffle: the counted types,
+            -- shots, and key passes (counted on the qualifier alone, whatever the type)
+            WHERE type IN ({', '.join(repr(t) for t in STATS_EVENT_TYPES)}) OR is_shot OR {KEY_PASS_CONDITION}
+        )
+        GROUP BY 1, 2, 3
+    """
+
+
+def get_match_stats_query(
+    project_id: str,
+    dataset_id: str,
+    columns: Optional[List[str]] = None,
+    seasons: Optional[Iterable[int]] = None,
+    where: str = "",
+    schedule_meta: ScheduleMeta = None,
+) -> str:
+    # `seasons` / `where` (e.g. "home_score IS NOT NULL") are pushed into each schedule branch;
+    # events are then restricted to the surviving matches.
+    schedule_union = _build_schedule_union(project_id, dataset_id, seasons, where, meta=schedule_meta)
     # Start with simple Event Union. If it breaks, I'll fix.
-    events_union = _build_events_union(project_id, dataset_id)
+    events_union = _build_events_union(project_id, dataset_id, seasons, meta=schedule_meta)
     
-    # Define Regex patterns outside f-string to avoid 'Invalid format specifier' errors
-    # Note: re_assist is no longer used for counting, as we use related_player_id on Goals
-    re_key = r"['\"]displayName['\"]\s*:\s*['\"]KeyPass['\"]"
+    if USE_STATS_ROLLUPS:
+        # Pre-aggregated nightly; partition/cluster pruning does the rest
+        event_stats_sql = f"""
+            SELECT * FROM `{project_id}.{dataset_id}.{EVENT_STATS_ROLLUP}`{_season_filter(seasons, meta=schedule_meta)}
+        """
+    else:
+        # Semi-join: only events of the matches kept above get aggregated
+        event_stats_sql = _team_event_stats_sql("all_events WHERE game_id IN (SELECT game_id FROM match_metadata)")
 
-    return f"""
+    return _select_columns(f"""
     WITH all_schedule AS (
         {schedule_union}
     ),
@@ -182,66 +898,25 @@ def get_match_stats_query(project_id: str, dataset_id: str) -> str:
         -- Removed: WHERE home_score IS NOT NULL (To match diagnostic count of 418)
     ),
     
+    -- Home and away rows from one pass over match_metadata
     match_teams AS (
         SELECT 
             game_id,
             match_date,
             season,
-            home_team as team,
-            IFNULL(home_score, 0) as goals_for,
-            IFNULL(away_score, 0) as goals_against,
-            'Mandante' as side
-        FROM match_metadata
-        UNION ALL
-        
-        SELECT 
-            game_id,
-            match_date,
-            season,
-            away_team as team,
-            IFNULL(away_score, 0) as goals_for,
-            IFNULL(home_score, 0) as goals_against,
-            'Visitante' as side
-        FROM match_metadata
-        UNION ALL
-        
-        SELECT 
-             game_id, 
-             match_date, 
-             season, 
-             away_team as team, 
-             IFNULL(away_score, 0) as goals_for, 
-             IFNULL(home_score, 0) as goals_against, 
-             'Visitante' as side 
-        FROM match_metadata 
+            r.team,
+            IFNULL(r.goals_for, 0) as goals_for,
+            IFNULL(r.goals_against, 0) as goals_against,
+            r.side
+        FROM match_metadata,
+        UNNEST([
+            STRUCT('Mandante' as side, home_team as team, home_score as goals_for, away_score as goals_against),
+            STRUCT('Visitante', away_team, away_score, home_score)
+        ]) r
     ),
     
-    event_stats AS (
-        SELECT
-            game_id as match_id,
-            team,
-            COUNTIF(type = 'Pass') as total_passes,
-            COUNTIF(type = 'Pass' AND outcome_type = 'Successful') as successful_passes,
-            
-            COUNTIF(is_shot = true) as total_shots,
-            COUNTIF(type = 'Goal') as goals_from_events,
-            COUNTIF(type IN ('SavedShot', 'Goal')) as shots_on_target,
-            
-            -- Defensive / Other
-            COUNTIF(type = 'Tackle') as tackles,
-            COUNTIF(type = 'Interception') as interceptions,
-            COUNTIF(type = 'Ball Recovery') as recoveries,
-            COUNTIF(type = 'Clearance') as clearances,
-            COUNTIF(type = 'Save') as saves,
-            COUNTIF(type = 'Foul') as fouls,
-            
-            -- Qualifiers (String Parsing)
-            -- Qualifiers (String Parsing)
-            -- Assist: Count Goals where related_player_id is set (Implicit Team Assist)
-            COUNTIF(type = 'Goal' AND related_player_id IS NOT NULL) as assists,
-            COUNTIF(REGEXP_CONTAINS(qualifiers, r'''{re_key}''')) as key_passes
-        FROM all_events
-        GROUP BY 1, 2
+    event_stats AS (
+        {event_stats_sql}
     )
     
     SELECT
@@ -266,50 +941,85 @@ def get_match_stats_query(project_id: str, dataset_id: str) -> str:
         IFNULL(e.key_passes, 0) as key_passes
     FROM match_teams t
     LEFT JOIN event_stats e ON t.game_id = e.match_id AND t.team = e.team
-    """
+    """, columns)
 
 
-def get_players_by_team_query(project_id: str, dataset_id: str, team: str) -> str:
-    events_union = _build_events_union(project_id, dataset_id)
-    return f"""
+def get_players_by_team_query(
+    project_id: str, dataset_id: str, team: str, seasons: Optional[Iterable[int]] = None,
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
+    """
+    Returns (sql, params): `team` is bound as @team so the query text is identical across teams.
+    `seasons` limits the scan to those seasons' tables (all seasons when None).
+    """
+    events_union = _build_events_union(
+        project_id, dataset_id, seasons, where="team = @team AND player IS NOT NULL", cols=("team", "player"),
+        meta=schedule_meta,
+    )
+    sql = f"""
     WITH all_events AS (
         {events_union}
     )
     SELECT DISTINCT player
     FROM all_events
-    WHERE team = '{team}' AND player IS NOT NULL
     ORDER BY player
     """
+    return sql, [bigquery.ScalarQueryParameter("team", "STRING", team)]
 
 
-def get_player_stats_query(project_id: str, dataset_id: str, year: int = 2026) -> str:
+def get_player_stats_query(project_id: str, dataset_id: str, year: int = 2026) -> Tuple[str, list]:
+    """
+    Returns (sql, params): `year` is bound as @year and picks the table through
+    _TABLE_SUFFIX, so the query text is identical across seasons.
+    """
     # Keep using specific year for radar chart for now
-    return f"""
+    sql = f"""
+    WITH event_flags AS (
+        SELECT
+            player,
+            team,
+            type = 'Pass' as is_pass,
+            type = 'Pass' AND outcome_type = 'Successful' as is_successful_pass,
+            is_shot = true as is_shot,
+            type = 'Goal' as is_goal,
+            type = 'Ball Recovery' as is_recovery,
+            type = 'Interception' as is_interception,
+            type = 'Tackle' as is_tackle
+        FROM `{project_id}.{dataset_id}.eventos_brasileirao_serie_a_*`
+        WHERE _TABLE_SUFFIX = CAST(@year AS STRING) AND player IS NOT NULL
+    )
     SELECT
         player,
         team,
         COUNT(*) as total_actions,
-        COUNTIF(type = 'Pass') as total_passes,
-        COUNTIF(type = 'Pass' AND outcome_type = 'Successful') as successful_passes,
-        SAFE_DIVIDE(COUNTIF(type = 'Pass' AND outcome_type = 'Successful'), COUNTIF(type = 'Pass')) as pass_accuracy,
+        COUNTIF(is_pass) as total_passes,
+        COUNTIF(is_successful_pass) as successful_passes,
+        SAFE_DIVIDE(COUNTIF(is_successful_pass), COUNTIF(is_pass)) as pass_accuracy,
         
-        COUNTIF(is_shot = true) as total_shots,
-        COUNTIF(type = 'Goal') as goals,
+        COUNTIF(is_shot) as total_shots,
+        COUNTIF(is_goal) as goals,
         
-        COUNTIF(type = 'Ball Recovery') as recoveries,
-        COUNTIF(type = 'Interception') as interceptions,
-        COUNTIF(type = 'Tackle') as tackles
+        COUNTIF(is_recovery) as recoveries,
+        COUNTIF(is_interception) as interceptions,
+        COUNTIF(is_tackle) as tackles
         
-    FROM `{project_id}.{dataset_id}.eventos_brasileirao_serie_a_{year}`
-    WHERE player IS NOT NULL
+    FROM event_flags
     GROUP BY 1, 2
     """
+    return sql, [bigquery.ScalarQueryParameter("year", "INT64", year)]
 
 
-def get_player_events_query(project_id: str, dataset_id: str, player: str) -> str:
+def get_player_events_query(
+    project_id: str, dataset_id: str, player: str, seasons: Optional[Iterable[int]] = None,
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
+    """
+    Returns (sql, params): `player` is bound as @player.
+    `seasons` limits the scan to those seasons' tables (all seasons when None).
+    """
     # Use union for map too
-    events_union = _build_events_union(project_id, dataset_id)
-    return f"""
+    events_union = _build_events_union(project_id, dataset_id, seasons, where="player = @player", meta=schedule_meta)
+    sql = f"""
     WITH all_events AS (
         {events_union}
     )
@@ -327,60 +1037,100 @@ def get_player_events_query(project_id: str, dataset_id: str, player: str) -> st
         minute,
         second
     FROM all_events
-    WHERE player = '{player}'
     """
+    return sql, [bigquery.ScalarQueryParameter("player", "STRING", player)]
 
 
-def get_player_rankings_query(project_id: str, dataset_id: str) -> str:
-    schedule_union = _build_schedule_union(project_id, dataset_id)
-    events_union = _build_events_union(project_id, dataset_id)
-
-    # Regex safety
-    # Regex safety
-    # re_assist removed, using join logic
-    re_key = r"['\"]displayName['\"]\s*:\s*['\"]KeyPass['\"]"
-    re_key = r"['\"]displayName['\"]\s*:\s*['\"]KeyPass['\"]"
-
+def _player_match_rows_sql(match_dates_sql: str, events_union: str) -> str:
+    """
+    One row per (player, team, match) with the ranking counters.
+    Shared by get_player_rankings_query and the player_match roll-up table.
+    `match_dates_sql` yields (game_id, match_date, season), see _build_match_dates.
+    """
     return f"""
-    WITH all_schedule AS (
-        {schedule_union}
-    ),
-    all_events AS (
+    WITH all_events AS (
         {events_union}
     ),
     
     match_dates AS (
         SELECT game_id, match_date as start_time, season
-        FROM all_schedule
+        FROM ({match_dates_sql})
     ),
     
-    player_stats AS (
+    -- One scan of all_events for both groupings:
+    --   (game_id, team, player, player_id)  -> player counters (and the id -> name map)
+    --   (game_id, team, related_player_id)  -> goals per assisting player id
+    event_agg AS (
         SELECT
             game_id,
-            player,
             team,
-            COUNTIF(is_shot = true) as shots,
-            COUNTIF(type = 'Goal') as goals,
-            COUNTIF(type = 'Pass' AND outcome_type = 'Successful') as successful_passes,
-            COUNTIF(type = 'Pass') as total_passes,
+            player,
+            player_id,
+            related_player_id,
+            GROUPING(player) = 0 as by_player,
+            COUNTIF(is_shot) as shots,
+            COUNTIF(event_cat = 2) as goals,
+            COUNTIF(event_cat = 1 AND is_successful) as successful_passes,
+            COUNTIF(event_cat = 1) as total_passes,
             
-            COUNTIF(type = 'Tackle') as tackles,
-            COUNTIF(type = 'Interception') as interceptions,
-            COUNTIF(type = 'Ball Recovery') as recoveries,
-            COUNTIF(type = 'Clearance') as clearances,
-            COUNTIF(type = 'Foul') as fouls, -- Corrected column name if needed
+            COUNTIF(event_cat = 3) as tackles,
+            COUNTIF(event_cat = 4) as interceptions,
+            COUNTIF(event_cat = 5) as recoveries,
+            COUNTIF(event_cat = 6) as clearances,
+            COUNTIF(event_cat = 7) as fouls, -- Corrected column name if needed
             
-            COUNTIF(REGEXP_CONTAINS(qualifiers, r'''{re_assist}''')) as assists,
-            COUNTIF(REGEXP_CONTAINS(qualifiers, r'''{re_key}''')) as key_passes
-        FROM all_events
-        WHERE player IS NOT NULL
+            COUNTIF(is_key_pass) as key_passes
+        FROM (
+            -- type is matched once per row (one CASE), the counters then compare small ints.
+            -- Event types are mutually exclusive, so a single category column is enough.
+            SELECT
+                game_id,
+                player,
+                player_id,
+                related_player_id,
+                team,
+                CASE type
+                    WHEN 'Pass' THEN 1
+                    WHEN 'Goal' THEN 2
+                    WHEN 'Tackle' THEN 3
+                    WHEN 'Interception' THEN 4
+                    WHEN 'Ball Recovery' THEN 5
+                    WHEN 'Clearance' THEN 6
+                    WHEN 'Foul' THEN 7
+                    ELSE 0
+                END as event_cat,
+                outcome_type = 'Successful' as is_successful,
+                is_shot = true as is_shot,
+                {KEY_PASS_CONDITION} as is_key_pass
+            FROM all_events
+        )
+        GROUP BY GROUPING SETS ((game_id, team, player, player_id), (game_id, team, related_player_id))
+    ),
+    
+    player_stats AS (
+        SELECT
+            game_id,
+            player,
+            team,
+            SUM(shots) as shots,
+            SUM(goals) as goals,
+            SUM(successful_passes) as successful_passes,
+            SUM(total_passes) as total_passes,
+            SUM(tackles) as tackles,
+            SUM(interceptions) as interceptions,
+            SUM(recoveries) as recoveries,
+            SUM(clearances) as clearances,
+            SUM(fouls) as fouls,
+            SUM(key_passes) as key_passes
+        FROM event_agg
+        WHERE by_player AND player IS NOT NULL
         GROUP BY 1, 2, 3
     ),
     
     player_names AS (
          SELECT DISTINCT player_id, player 
-         FROM all_events 
-         WHERE player IS NOT NULL
+         FROM event_agg 
+         WHERE by_player AND player IS NOT NULL
     ),
     
     assist_stats AS (
@@ -388,10 +1138,10 @@ def get_player_rankings_query(project_id: str, dataset_id: str) -> str:
             e.game_id,
             n.player, -- Map ID to Name
             e.team,
-            COUNT(*) as assists
-        FROM all_events e
+            SUM(e.goals) as assists
+        FROM event_agg e
         JOIN player_names n ON e.related_player_id = n.player_id
-        WHERE e.type = 'Goal' AND e.related_player_id IS NOT NULL
+        WHERE NOT e.by_player AND e.related_player_id IS NOT NULL AND e.goals > 0
         GROUP BY 1, 2, 3
     )
     
@@ -410,8 +1160,6 @@ def get_player_rankings_query(project_id: str, dataset_id: str) -> str:
         p.recoveries,
         p.clearances,
         p.fouls,
-        p.clearances,
-        p.fouls,
         COALESCE(a.assists, 0) as assists,
         p.key_passes
     FROM player_stats p
@@ -421,6 +1169,24 @@ def get_player_rankings_query(project_id: str, dataset_id: str) -> str:
     """
 
 
+def get_player_rankings_query(
+    project_id: str,
+    dataset_id: str,
+    columns: Optional[List[str]] = None,
+    seasons: Optional[Iterable[int]] = None,
+    schedule_meta: ScheduleMeta = None,
+) -> str:
+    if USE_STATS_ROLLUPS:
+        return _select_columns(
+            f"SELECT * FROM `{project_id}.{dataset_id}.{PLAYER_MATCH_ROLLUP}`{_season_filter(seasons, meta=schedule_meta)}",
+            columns
+        )
+    # `seasons` limits both sources to those seasons' tables (all seasons when None)
+    match_dates = _build_match_dates(project_id, dataset_id, seasons, meta=schedule_meta)
+    events_union = _build_events_union(project_id, dataset_id, seasons, meta=schedule_meta)
+    return _select_columns(_player_match_rows_sql(match_dates, events_union), columns)
+
+
 def get_dynamic_ranking_query(
     project_id: str, 
     dataset_id: str, 
@@ -431,74 +1197,19 @@ def get_dynamic_ranking_query(
     use_related_player: bool = False,
     teams: object = None, # str or list
     players: object = None, # str or list
-    perspective: str = "pro" # "pro" or "against"
-) -> str:
+    perspective: str = "pro", # "pro" or "against"
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
     """
     Constructs a specific query based on dynamic user filters.
     Returns grouping by match_id + subject to allow same downstream processing.
+    Returns (sql, params): the team/player selections are bound as @teams/@players.
     """
-    schedule_union = _build_schedule_union(project_id, dataset_id)
-    events_union = _build_events_union(project_id, dataset_id)
-    
-    # Build WHERE clauses
-    where_clauses = ["1=1"] # fallback
+    schedule_union = _build_schedule_union(project_id, dataset_id, meta=schedule_meta)
+    events_union = _build_events_union(project_id, dataset_id, meta=schedule_meta)
     
-    # 1. Event Type
-    if event_types and "Todos" not in event_types:
-        if isinstance(event_types, list):
-             types_str = "', '".join(event_types)
-             where_clauses.append(f"type IN ('{types_str}')")
-        else:
-             where_clauses.append(f"type = '{event_types}'")
-    
-    # 2. Outcome
-    if outcomes and "Todos" not in outcomes:
-        target_outcomes = []
-        if isinstance(outcomes, str): outcomes = [outcomes]
-        for out in outcomes:
-            if out == "Sucesso": target_outcomes.append("Successful")
-            elif out == "Falha": target_outcomes.append("Unsuccessful")
-            else: target_outcomes.append(out)
-            
-        if target_outcomes:
-            out_str = "', '".join(target_outcomes)
-            where_clauses.append(f"outcome_type IN ('{out_str}')")
-
-    # 3. Qualifiers (Regex OR)
-    if qualifiers and "Todos (Qualquer)" not in qualifiers:
-        if isinstance(qualifiers, str): qualifiers = [qualifiers]
-        safe_quals = [re.escape(q) for q in qualifiers if q]
-        if safe_quals:
-            pattern = "|".join(safe_quals)
-            where_clauses.append(f"REGEXP_CONTAINS(qualifiers, r'{pattern}')")
-
-    # 4. Teams - Will be handled later via effective_team if needed
-    # But checking input here for variables
-    # If user filters by team, we want to filter on effective_team later.
-    team_in_clause = None
-    if teams and "Todos" not in teams:
-        if isinstance(teams, list):
-             teams_str = "', '".join(teams)
-             team_in_clause = f"effective_team IN ('{teams_str}')"
-        else:
-             team_in_clause = f"effective_team = '{teams}'"
-        
-        # We DO NOT add to where_clauses yet because 'team' column checks would be wrong for OGs
-        # where_clauses.append(team_in_clause) <--- We add this to the FINAL Where using effective_team
-
-    # 5. Players
-    if players and "Todos" not in players:
-        if isinstance(players, list):
-             players_str = "', '".join(players)
-             where_clauses.append(f"player IN ('{players_str}')")
-        else:
-             where_clauses.append(f"player = '{players}'")
-
-    where_str = " AND ".join(where_clauses)
-    
-    # Add effective_team filter if it exists
-    if team_in_clause:
-        where_str += f" AND {team_in_clause}"
+    # Build WHERE clause (teams are matched on effective_team, so own goals count for the beneficiary)
+    where_str, params = _ranking_filter_where(event_types, outcomes, qualifiers, teams, players)
 
     
     # Select columns based on subject
@@ -517,11 +1228,20 @@ def get_dynamic_ranking_query(
     # Special handling for Assists (Goal Related Player)
     extra_cte = ""
     if use_related_player and subject == "Jogadores":
-        extra_cte = """
+        if USE_STATS_ROLLUPS:
+            extra_cte = f"""
+        , player_names AS (
+             SELECT player_id, player FROM `{project_id}.{dataset_id}.{PLAYER_NAMES_TABLE}`
+        )
+        """
+        else:
+            extra_cte = """
         , player_names AS (
              SELECT DISTINCT player_id, player FROM all_events WHERE player IS NOT NULL
         )
         """
+        # Raw events have no effective_team: match the team filter on the original team
+        raw_where = _EFFECTIVE_TEAM_RE.sub("team", where_str)
         # Override for Assist Logic (Calculated on RAW events usually, but we should use events_enhanced?)
         # If we use events_enhanced, we get effective_team.
         # Ideally yes.
@@ -536,7 +1256,7 @@ def get_dynamic_ranking_query(
             JOIN player_names n ON e.related_player_id = n.player_id
             WHERE 1=1
             AND e.related_player_id IS NOT NULL
-            AND {where_str.replace('effective_team', 'team')} -- Provide fallback if we use raw events
+            AND {raw_where} -- Provide fallback if we use raw events
             GROUP BY 1, 2, 3
         )
         """
@@ -547,7 +1267,7 @@ def get_dynamic_ranking_query(
         # where_str already has effective_team logic if 'teams' filter active.
         
         final_where = where_str
-        final_base_where = base_where.replace('team', 'effective_team')
+        final_base_where = _TEAM_RE.sub("effective_team", base_where)
         
         # Note: events_enhanced has 'team' (original) and 'effective_team' (beneficiary).
         
@@ -560,7 +1280,7 @@ def get_dynamic_ranking_query(
                 SELECT
                     game_id,
                     effective_team as team,
-                    COUNT(*) as metric_count
+                    SUM(event_weight) as metric_count
                 FROM {target_table}
                 WHERE {final_base_where}
                 AND {final_where}
@@ -573,7 +1293,7 @@ def get_dynamic_ranking_query(
             filtered_events AS (
                 SELECT
                     {select_cols},
-                    COUNT(*) as metric_count
+                    SUM(event_weight) as metric_count
                 FROM {target_table}
                 WHERE {base_where}
                 AND {final_where}
@@ -581,22 +1301,16 @@ def get_dynamic_ranking_query(
             )
             """
 
-    # Logic for Effective Team
-    # Swaps team if it's an Own Goal so the goal counts for the beneficiary (Opponent of the scorer)
-    # Regex covers "OwnGoal", "Own Goal", "Gol Contra"
-    effective_team_calculation = """
-        CASE 
-            WHEN e.type = 'Goal' AND REGEXP_CONTAINS(e.qualifiers, r'(?i)(Own\s*Goal|Gol\s*Contra)') THEN
-                CASE 
-                    WHEN e.team = m.home_team THEN m.away_team 
-                    WHEN e.team = m.away_team THEN m.home_team 
-                    ELSE e.team
-                END
-            ELSE e.team
-        END as effective_team
+    if USE_EVENTS_ENHANCED_TABLE:
+        events_enhanced_ctes = f"""
+    events_enhanced AS (
+        SELECT * FROM `{project_id}.{dataset_id}.{EVENTS_ENHANCED_TABLE}`
+    )
     """
+    else:
+        events_enhanced_ctes = _EVENTS_ENHANCED_CTES
 
-    return f"""
+    sql = f"""
     WITH all_schedule AS (
         {schedule_union}
     ),
@@ -609,83 +1323,7 @@ def get_dynamic_ranking_query(
         FROM all_schedule
     ),
     
-    -- Ghost Goal Logic: Inject missing goals found in Schedule but missing in Events
-    existing_goals AS (
-        SELECT game_id, team, count(*) as goals
-        FROM all_events
-        WHERE type = 'Goal'
-        GROUP BY 1, 2
-    ),
-    
-    missing_goals AS (
-        SELECT 
-            m.game_id, 
-            m.season,
-            m.home_team, 
-            m.away_team,
-            (m.home_score - IFNULL(eh.goals, 0)) as home_diff,
-            (m.away_score - IFNULL(ea.goals, 0)) as away_diff
-        FROM match_metadata m
-        LEFT JOIN existing_goals eh ON m.game_id = eh.game_id AND eh.team = m.home_team
-        LEFT JOIN existing_goals ea ON m.game_id = ea.game_id AND ea.team = m.away_team
-        WHERE (m.home_score > IFNULL(eh.goals, 0)) OR (m.away_score > IFNULL(ea.goals, 0))
-    ),
-    
-    ghost_events AS (
-        -- Home Ghosts
-        SELECT 
-            game_id, 
-            home_team as team, 
-            CAST(NULL as STRING) as player, 
-            CAST(NULL as FLOAT64) as player_id,
-            'Goal' as type, 
-            'Successful' as outcome_type, 
-            '[]' as qualifiers,
-            90 as expanded_minute, 
-            'FullTime' as period,
-            50.0 as x, 50.0 as y, 
-            50.0 as end_x, 50.0 as end_y,
-            CAST(NULL as BOOL) as is_shot,
-            CAST(NULL as FLOAT64) as related_player_id,
-            season
-        FROM missing_goals, UNNEST(GENERATE_ARRAY(1, home_diff))
-        WHERE home_diff > 0
-        
-        UNION ALL
-        
-        -- Away Ghosts
-        SELECT 
-            game_id, 
-            away_team as team, 
-             CAST(NULL as STRING) as player, 
-            CAST(NULL as FLOAT64) as player_id,
-            'Goal' as type, 
-            'Successful' as outcome_type, 
-            '[]' as qualifiers,
-            90 as expanded_minute, 
-            'FullTime' as period,
-            50.0 as x, 50.0 as y, 
-            50.0 as end_x, 50.0 as end_y,
-            CAST(NULL as BOOL) as is_shot,
-            CAST(NULL as FLOAT64) as related_player_id,
-            season
-        FROM missing_goals, UNNEST(GENERATE_ARRAY(1, away_diff))
-        WHERE away_diff > 0
-    ),
-    
-    all_events_fixed AS (
-        SELECT * FROM all_events
-        UNION ALL
-        SELECT * FROM ghost_events
-    ),
-    
-    events_enhanced AS (
-        SELECT 
-            e.*,
-            {effective_team_calculation}
-        FROM all_events_fixed e
-        JOIN match_metadata m ON e.game_id = m.game_id
-    )
+    {events_enhanced_ctes}
     {extra_cte},
     
     {filtered_events_block}
@@ -698,6 +1336,25 @@ def get_dynamic_ranking_query(
     FROM filtered_events p
     JOIN match_metadata m ON {join_on}
     """
+    return sql, params
+
+
+# Per-subject snippets of get_conversion_ranking_query:
+# (group_cols, select_cols, base_where, player column of the final SELECT)
+_CONVERSION_SUBJECT_SQL = {
+    "Jogadores": (
+        "game_id, player, effective_team",
+        "game_id, player, effective_team as team",
+        "player IS NOT NULL",
+        "c.player,",
+    ),
+    "Equipes": (
+        "game_id, effective_team",
+        "game_id, effective_team as team",
+        "effective_team IS NOT NULL",
+        "",
+    ),
+}
 
 
 def get_conversion_ranking_query(
@@ -717,12 +1374,14 @@ def get_conversion_ranking_query(
     
     teams: object = None,
     players: object = None,
-    perspective: str = "pro"
-) -> str:
+    perspective: str = "pro",
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
 
     """
     Constructs a ranking query for Efficiency/Conversion.
     Returns: game_id, team/player, numerator_count, denominator_count, ratio
+    Returns (sql, params): the team/player selections are bound as @teams/@players.
     """
     # Reuse the logic builders from get_dynamic_ranking_query but applied twice
     # We essentially need to generate the CTEs for both, then join.
@@ -735,108 +1394,21 @@ def get_conversion_ranking_query(
     # checking file structure... _build_enhanced_events is not a separate function yet.
     # I will inline it for now to ensure correctness, as extracting might be risky without tests.
     
-    schedule_union = _build_schedule_union(project_id, dataset_id)
-    events_union = _build_events_union(project_id, dataset_id)
+    schedule_union = _build_schedule_union(project_id, dataset_id, meta=schedule_meta)
+    # Only the columns the filters, grouping and effective_team read (no coordinates etc.)
+    events_union = _build_events_union(project_id, dataset_id, cols=RANKING_EVENT_COLUMNS, meta=schedule_meta)
     
-    def _build_filter_where(etypes, outcomes, quals, teams, players):
-        where_clauses = ["1=1"]
-        # 1. Event Type
-        if etypes and "Todos" not in etypes:
-            if isinstance(etypes, list):
-                 types_str = "', '".join(etypes)
-                 where_clauses.append(f"type IN ('{types_str}')")
-            else:
-                 where_clauses.append(f"type = '{etypes}'")
-        
-        # 2. Outcome
-        if outcomes and "Todos" not in outcomes:
-            target_outcomes = []
-            if isinstance(outcomes, str): outcomes = [outcomes]
-            for out in outcomes:
-                if out == "Sucesso": target_outcomes.append("Successful")
-                elif out == "Falha": target_outcomes.append("Unsuccessful")
-                else: target_outcomes.append(out)
-            if target_outcomes:
-                out_str = "', '".join(target_outcomes)
-                where_clauses.append(f"outcome_type IN ('{out_str}')")
-
-        # 3. Qualifiers
-        if quals and "Todos (Qualquer)" not in quals:
-            if isinstance(quals, str): quals = [quals]
-            safe_quals = [re.escape(q) for q in quals if q]
-            if safe_quals:
-                pattern = "|".join(safe_quals)
-                where_clauses.append(f"REGEXP_CONTAINS(qualifiers, r'{pattern}')")
-        
-        # 4. Teams (Applied on effective_team later)
-        team_clause = None
-        if teams and "Todos" not in teams:
-            if isinstance(teams, list):
-                 teams_str = "', '".join(teams)
-                 team_clause = f"effective_team IN ('{teams_str}')"
-            else:
-                 team_clause = f"effective_team = '{teams}'"
-
-        # 5. Players
-        if players and "Todos" not in players:
-            if isinstance(players, list):
-                 players_str = "', '".join(players)
-                 where_clauses.append(f"player IN ('{players_str}')")
-            else:
-                 where_clauses.append(f"player = '{players}'")
-
-        base_where = " AND ".join(where_clauses)
-        if team_clause:
-            base_where += f" AND {team_clause}"
-            
-        return base_where
-
-    # Build Where clauses
-    where_num = _build_filter_where(num_event_types, num_outcomes, num_qualifiers, teams, players)
-    where_den = _build_filter_where(den_event_types, den_outcomes, den_qualifiers, teams, players)
+    # Build Where clauses (both sides bind the same @teams/@players, one params list serves both)
+    where_num, params = _ranking_filter_where(num_event_types, num_outcomes, num_qualifiers, teams, players)
+    where_den, _ = _ranking_filter_where(den_event_types, den_outcomes, den_qualifiers, teams, players)
     
-    # Grouping Config
-    if subject == "Jogadores":
-        group_cols = "game_id, player, team"
-        select_cols = "game_id, player, team"
-        join_on = "p.game_id = m.game_id"
-        base_where_sql = "player IS NOT NULL"
-    else:
-        # Equipes
-        group_cols = "game_id, team" # effectively effective_team aliased
-        select_cols = "game_id, effective_team as team"
-        join_on = "p.game_id = m.game_id"
-        base_where_sql = "team IS NOT NULL" # targets effective_team
-
+    group_cols, select_cols, base_where_sql, player_select = _CONVERSION_SUBJECT_SQL[
+        "Jogadores" if subject == "Jogadores" else "Equipes"
+    ]
     # Logic for Effective Team (Same as dynamic ranking)
-    if perspective == "against":
-         effective_team_calculation = """
-            CASE
-               WHEN e.type = 'Goal' AND REGEXP_CONTAINS(e.qualifiers, r'OwnGoal') THEN e.team
-               ELSE
-                    CASE 
-                        WHEN e.team = m.home_team THEN m.away_team 
-                        WHEN e.team = m.away_team THEN m.home_team 
-                        ELSE e.team
-                    END
-            END as effective_team
-        """
-    else:
-        effective_team_calculation = """
-            CASE 
-                WHEN e.type = 'Goal' AND REGEXP_CONTAINS(e.qualifiers, r'OwnGoal') THEN
-                    CASE 
-                        WHEN e.team = m.home_team THEN m.away_team 
-                        WHEN e.team = m.away_team THEN m.home_team 
-                        ELSE e.team
-                    END
-                ELSE e.team
-            END as effective_team
-        """
+    effective_team_calculation = _CONVERSION_EFFECTIVE_TEAM_SQL["against" if perspective == "against" else "pro"]
 
-
-    
-    return f"""
+    sql = f"""
     WITH all_schedule AS (
         {schedule_union}
     ),
@@ -847,118 +1419,130 @@ def get_conversion_ranking_query(
         SELECT game_id, match_date as start_time, season, home_team, away_team
         FROM all_schedule
     ),
+    -- Narrow per-game team lookup (broadcast to the events scan, see get_dynamic_ranking_query)
+    match_teams_map AS (
+        SELECT game_id, home_team, away_team FROM match_metadata
+    ),
     events_enhanced AS (
         SELECT 
-            e.*,
+            {", ".join(f"e.{c}" for c in RANKING_EVENT_COLUMNS)},
             -- Calculate Effective Team (Fix for Own Goals)
-            e.*,
             {effective_team_calculation}
 
         FROM all_events e
-        JOIN match_metadata m ON e.game_id = m.game_id
+        JOIN match_teams_map m ON e.game_id = m.game_id
     ),
     
-    cte_numerator AS (
+    -- Numerator and denominator from one pass over events_enhanced
+    cte_counts AS (
         SELECT
             {select_cols},
-            COUNT(*) as num_count
-        FROM events_enhanced
-        WHERE {base_where_sql.replace('team', 'effective_team')} 
-        AND {where_num}
-        GROUP BY {group_cols.replace('team', 'effective_team')}
-    ),
-    
-    cte_denominator AS (
-        SELECT
-             {select_cols},
-            COUNT(*) as den_count
+            COUNTIF({where_num}) as num_count,
+            COUNTIF({where_den}) as den_count
         FROM events_enhanced
-        WHERE {base_where_sql.replace('team', 'effective_team')} 
-        AND {where_den}
-        GROUP BY {group_cols.replace('team', 'effective_team')}
+        WHERE {base_where_sql}
+        AND (({where_num}) OR ({where_den}))
+        GROUP BY {group_cols}
     )
     
     SELECT
-        COALESCE(n.game_id, d.game_id) as game_id,
-        COALESCE(n.team, d.team) as team,
-        { "COALESCE(n.player, d.player) as player," if subject == "Jogadores" else "" }
+        c.game_id,
+        c.team,
+        {player_select}
         
         m.start_time as match_date,
         m.season,
         
-        COALESCE(n.num_count, 0) as numerator,
-        COALESCE(d.den_count, 0) as denominator,
-        
-        SAFE_DIVIDE(COALESCE(n.num_count, 0), COALESCE(d.den_count, 0)) as ratio
+        c.num_count as numerator,
+        c.den_count as denominator,
         
-    FROM cte_numerator n
-    FULL OUTER JOIN cte_denominator d 
-        ON n.game_id = d.game_id 
-        AND n.team = d.team
-        { "AND n.player = d.player" if subject == "Jogadores" else "" }
+        SAFE_DIVIDE(c.num_count, c.den_count) as ratio
         
-    JOIN match_metadata m ON COALESCE(n.game_id, d.game_id) = m.game_id
+    FROM cte_counts c
+    JOIN match_metadata m ON c.game_id = m.game_id
     """
+    return sql, params
 
 
 def get_teams_match_count_query(
     project_id: str, 
     dataset_id: str, 
     teams: object = None, 
-    date_range: tuple = None
-) -> str:
+    date_range: tuple = None,
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
     """
     Returns total matches per team in the filtered period.
+    Returns (sql, params): teams and dates are bound as @teams / @start_date, @end_date.
     """
-    schedule_union = _build_schedule_union(project_id, dataset_id)
-    
     where_clauses = ["1=1"]
+    # Pushed into every schedule branch, so each year's scan is filtered before the union
+    branch_clauses = []
     
     # Teams Filter
+    params = []
     if teams and "Todos" not in teams:
-        if isinstance(teams, list):
-             teams_str = "', '".join(teams)
-             where_clauses.append(f"team IN ('{teams_str}')")
-        else:
-             where_clauses.append(f"team = '{teams}'")
+        where_clauses.append("team IN UNNEST(@teams)")
+        branch_clauses.append("(home_team IN UNNEST(@teams) OR away_team IN UNNEST(@teams))")
+        params.append(_string_array_param("teams", teams))
              
     # Date Filter
-    if date_range:
-        start_date = date_range[0]
-        # Handle tuple of 1 or 2
-        if len(date_range) > 1:
-            end_date = date_range[1]
-            where_clauses.append(f"match_date >= '{start_date}' AND match_date <= '{end_date}'")
-        else:
-             where_clauses.append(f"match_date >= '{start_date}'")
+    date_clause, date_params = _date_range_where("match_date", date_range)
+    if date_clause:
+        branch_clauses.append(date_clause)
+        params += date_params
              
     final_where = " AND ".join(where_clauses)
+    seasons = _date_range_seasons(date_range)
 
-    return f"""
-    WITH all_schedule AS (
+    if USE_STATS_ROLLUPS:
+        # Already one row per team-match participation (the team filter applies below)
+        source_ctes = f"""
+    matches_per_team AS (
+        SELECT season, team, game_id, match_date
+        FROM `{project_id}.{dataset_id}.{TEAM_MATCH_ROLLUP}`{_season_filter(seasons, date_clause, schedule_meta)}
+    )
+    """
+    else:
+        # Only the columns counted here; scores/status are never read
+        schedule_union = _build_match_dates(
+            project_id, dataset_id, seasons,
+            extra=("home_team", "away_team"), where=" AND ".join(branch_clauses), meta=schedule_meta
+        )
+        source_ctes = f"""
+    all_schedule AS (
         {schedule_union}
     ),
     
     matches_per_team AS (
-        -- Unpivot so we have one row per team-match participation with date
-        SELECT season, home_team as team, game_id, match_date, status FROM all_schedule
-        WHERE home_team IS NOT NULL
-        UNION ALL
-        SELECT season, away_team as team, game_id, match_date, status FROM all_schedule
-        WHERE away_team IS NOT NULL
+        -- Unpivot so we have one row per team-match participation with date (one pass)
+        SELECT season, team, game_id, match_date
+        FROM all_schedule, UNNEST([home_team, away_team]) team
+        WHERE team IS NOT NULL
+    )
+    """
+
+    sql = f"""
+    WITH {source_ctes},
+    
+    -- Dedup once, then a plain COUNT(*) per group (no per-group DISTINCT)
+    distinct_participations AS (
+        SELECT DISTINCT season, team, game_id
+        FROM matches_per_team
+        WHERE {final_where}
+        -- AND (status = 'Finished' OR status = '2') -- REMOVING FILTER to allow diagnostic of future matches
     )
     
     SELECT 
         season, 
         team, 
-        COUNT(DISTINCT game_id) as total_games
-    FROM matches_per_team
-    WHERE {final_where}
-    -- AND (status = 'Finished' OR status = '2') -- REMOVING FILTER to allow diagnostic of future matches
+        COUNT(*) as total_games
+    FROM distinct_participations
     GROUP BY 1, 2
 
     ORDER BY season DESC, total_games ASC
     """
+    return sql, params
 
 
 
@@ -968,74 +1552,83 @@ def get_player_match_counts_query(
     dataset_id: str, 
     teams: object = None, 
     players: object = None,
-    date_range: tuple = None
-) -> str:
+    date_range: tuple = None,
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
     """
     Returns total matches per player (participation) in the filtered period.
+    Returns (sql, params): teams, players and dates are bound as query parameters.
     """
-    events_union = _build_events_union(project_id, dataset_id)
-    schedule_union = _build_schedule_union(project_id, dataset_id)
+    # Only the seasons the date range can reach are read from both sources
+    seasons = _date_range_seasons(date_range)
+    events_union = _build_events_union(
+        project_id, dataset_id, seasons, cols=("game_id", "team", "player"), meta=schedule_meta
+    )
+    schedule_union = _build_schedule_union(project_id, dataset_id, seasons, meta=schedule_meta)
     
     where_clauses = ["player IS NOT NULL"] # Base condition
+    params = []
     
     # Teams Filter
     if teams and "Todos" not in teams:
-        if isinstance(teams, list):
-             teams_str = "', '".join(teams)
-             where_clauses.append(f"team IN ('{teams_str}')")
-        else:
-             where_clauses.append(f"team = '{teams}'")
+        where_clauses.append("team IN UNNEST(@teams)")
+        params.append(_string_array_param("teams", teams))
 
     # Players Filter
     if players and "Todos" not in players:
-        if isinstance(players, list):
-             players_str = "', '".join(players)
-             where_clauses.append(f"player IN ('{players_str}')")
-        else:
-             where_clauses.append(f"player = '{players}'")
+        where_clauses.append("player IN UNNEST(@players)")
+        params.append(_string_array_param("players", players))
              
-    # Date Filter Logic (Needs Join)
-    date_filter = "1=1"
-    if date_range:
-        start_date = date_range[0]
-        if len(date_range) > 1:
-            end_date = date_range[1]
-            date_filter = f"m.match_date >= '{start_date}' AND m.match_date <= '{end_date}'"
-        else:
-             date_filter = f"m.match_date >= '{start_date}'"
+    # Date Filter (applied to the schedule before it meets the events)
+    date_filter, date_params = _date_range_where("match_date", date_range)
+    date_filter = date_filter or "1=1"
+    params += date_params
 
     where_str = " AND ".join(where_clauses)
 
-    return f"""
+    sql = f"""
     WITH all_events AS (
         {events_union}
     ),
     all_schedule AS (
         {schedule_union}
     ),
+    -- Only completed matches in the period; filtered before any event is joined
     match_metadata AS (
-        SELECT game_id, match_date, season FROM all_schedule
+        SELECT game_id, season
+        FROM all_schedule
+        WHERE {date_filter}
+        AND (status = 'Finished' OR status = '2')
+    ),
+    -- One row per (player, team, match) before the join instead of one per event
+    player_games AS (
+        SELECT DISTINCT game_id, team, player
+        FROM all_events
+        WHERE {where_str}
+        AND game_id IN (SELECT game_id FROM match_metadata)
+    ),
+    distinct_participations AS (
+        SELECT DISTINCT e.player, e.team, m.season, e.game_id
+        FROM player_games e
+        JOIN match_metadata m ON e.game_id = m.game_id
     )
     
     SELECT 
-        e.player,
-        e.team,
-        m.season,
-        COUNT(DISTINCT e.game_id) as total_games
-    FROM all_events e
-    JOIN match_metadata m ON e.game_id = m.game_id
-    WHERE {where_str}
-    AND {date_filter}
-    AND (m.status = 'Finished' OR m.status = '2') -- Only completed matches
+        player,
+        team,
+        season,
+        COUNT(*) as total_games
+    FROM distinct_participations
     GROUP BY 1, 2, 3
 
     """
+    return sql, params
 
-def get_all_teams_query(project_id: str, dataset_id: str) -> str:
+def get_all_teams_query(project_id: str, dataset_id: str, schedule_meta: ScheduleMeta = None) -> str:
     """
     Get unique list of teams for dropdowns.
     """
-    schedule_union = _build_schedule_union(project_id, dataset_id)
+    schedule_union = _build_schedule_union(project_id, dataset_id, meta=schedule_meta)
     return f"""
     WITH all_schedule AS (
         {schedule_union}
@@ -1049,18 +1642,25 @@ def get_all_teams_query(project_id: str, dataset_id: str) -> str:
     ORDER BY team
     """
 
-def get_all_players_query(project_id: str, dataset_id: str, teams: list = None) -> str:
+def get_all_players_query(
+    project_id: str,
+    dataset_id: str,
+    teams: list = None,
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
     """
     Get unique list of players, optionally filtered by teams.
+    Returns (sql, params): `teams` is bound as @teams.
     """
-    events_union = _build_events_union(project_id, dataset_id)
+    events_union = _build_events_union(project_id, dataset_id, cols=("team", "player"), meta=schedule_meta)
     
     where_clause = "player IS NOT NULL"
+    params = []
     if teams:
-        teams_str = "', '".join(teams)
-        where_clause += f" AND team IN ('{teams_str}')"
+        where_clause += " AND team IN UNNEST(@teams)"
+        params.append(_string_array_param("teams", teams))
         
-    return f"""
+    sql = f"""
     WITH all_events AS (
         {events_union}
     )
@@ -1069,68 +1669,66 @@ def get_all_players_query(project_id: str, dataset_id: str, teams: list = None)
     WHERE {where_clause}
     ORDER BY player
     """
+    return sql, params
 
 def get_clean_sheets_query(
     project_id: str, 
     dataset_id: str, 
     teams: object = None, 
-    date_range: tuple = None
-) -> str:
+    date_range: tuple = None,
+    schedule_meta: ScheduleMeta = None,
+) -> Tuple[str, list]:
     """
     Returns query to count Clean Sheets (matches where goals_against == 0).
+    Returns (sql, params): teams and dates are bound as @teams / @start_date, @end_date.
     """
-    schedule_union = _build_schedule_union(project_id, dataset_id)
-    
     where_clauses = ["1=1"] # Base
-    
-    schedule_cte = f"""
-    WITH all_schedule AS (
-        {schedule_union}
-    ),
-    """
+    params = []
     
     # Teams
     teams_filter = ""
     if teams and "Todos" not in teams:
-        if isinstance(teams, list):
-             teams_str = "', '".join(teams)
-             teams_filter = f"AND team IN ('{teams_str}')"
-        else:
-             teams_filter = f"AND team = '{teams}'"
+        teams_filter = "AND team IN UNNEST(@teams)"
+        params.append(_string_array_param("teams", teams))
              
     # Date
-    date_filter = ""
-    if date_range:
-        start_date = date_range[0]
-        if len(date_range) > 1:
-            end_date = date_range[1]
-            date_filter = f"AND match_date >= '{start_date}' AND match_date <= '{end_date}'"
-        else:
-             date_filter = f"AND match_date >= '{start_date}'"
+    date_clause, date_params = _date_range_where("match_date", date_range)
+    date_filter = f"AND {date_clause}" if date_clause else ""
+    params += date_params
+    seasons = _date_range_seasons(date_range)
              
-    
-    return f"""
-    {schedule_cte}
+    if USE_STATS_ROLLUPS:
+        source = f"""
+    match_teams AS (
+        SELECT game_id, match_date, season, team, IFNULL(goals_against, 0) as goals_against
+        FROM `{project_id}.{dataset_id}.{TEAM_MATCH_ROLLUP}`{_season_filter(seasons, "match_date IS NOT NULL", schedule_meta)}
+    )
+    """
+    else:
+        source = f"""
+    all_schedule AS (
+        {_build_schedule_union(project_id, dataset_id, seasons, "match_date IS NOT NULL", schedule_meta)}
+    ),
     
     match_teams AS (
+        -- Unpivot home/away in one scan of the schedule
         SELECT 
             game_id,
             match_date,
             season,
-            home_team as team,
-            IFNULL(away_score, 0) as goals_against
-        FROM all_schedule
-        WHERE home_team IS NOT NULL
-        UNION ALL
-        SELECT 
-            game_id,
-            match_date,
-            season,
-            away_team as team,
-            IFNULL(home_score, 0) as goals_against
-        FROM all_schedule
-        WHERE away_team IS NOT NULL
+            t.team,
+            IFNULL(t.goals_against, 0) as goals_against
+        FROM all_schedule,
+            UNNEST([
+                STRUCT(home_team as team, away_score as goals_against),
+                STRUCT(away_team as team, home_score as goals_against)
+            ]) t
+        WHERE t.team IS NOT NULL
     )
+    """
+    
+    sql = f"""
+    WITH {source}
     
     SELECT
         team,
@@ -1140,8 +1738,51 @@ def get_clean_sheets_query(
     WHERE goals_against = 0
     {teams_filter}
     {date_filter}
-    AND match_date IS NOT NULL
     GROUP BY 1, 2
     ORDER BY clean_sheets DESC
     """
+    return sql, params
+
+
+def get_events_column_drift_query(project_id: str, dataset_id: str) -> str:
+    """
+    EVENT_COLUMNS whose type differs between the per-season events tables (diagnostic),
+    one row per (column, type) with the seasons having it. Any row here breaks the
+    wildcard scan of _events_union_sql. Reads INFORMATION_SCHEMA only (no table scan).
+    """
+    tables = ", ".join(f"'eventos_brasileirao_serie_a_{year}'" for year in YEARS_TO_QUERY)
+    columns = ", ".join(f"'{c}'" for c in EVENT_COLUMNS)
+    return f"""
+    WITH event_columns AS (
+        SELECT
+            column_name,
+            data_type,
+            CAST(REGEXP_EXTRACT(table_name, r'_(\\d{{4}})$') AS INT64) as season
+        FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMNS`
+        WHERE table_name IN ({tables}) AND column_name IN ({columns})
+    )
+    SELECT
+        column_name,
+        data_type,
+        STRING_AGG(CAST(season AS STRING), ', ' ORDER BY season) as seasons
+    FROM event_columns
+    WHERE column_name IN (
+        SELECT column_name FROM event_columns GROUP BY 1 HAVING COUNT(DISTINCT data_type) > 1
+    )
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    """
 
+
+def get_metrics_validation_query(project_id: str, dataset_id: str, year: int = 2024) -> str:
+    """
+    KeyPass-tagged passes vs goals with an identified assisting player for a single season (diagnostic).
+    Both counts come from one scan, returned as a single row (key_passes, assists).
+    """
+    return f"""
+    SELECT
+        COUNTIF(type = 'Pass' AND {KEY_PASS_CONDITION}) as key_passes,
+        COUNTIF(type = 'Goal' AND related_player_id IS NOT NULL) as assists
+    FROM `{project_id}.{dataset_id}.eventos_brasileirao_serie_a_{int(year)}`
+    WHERE type IN ('Pass', 'Goal')
+    """
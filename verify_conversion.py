@@ -1,12 +1,11 @@
 import sys
 import os
 import pandas as pd
-from google.cloud import bigquery
 
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.bq_io import get_bq_client
+from src.bq_io import get_bq_client, load_schedule_meta, run_query
 from src.queries import get_conversion_ranking_query
 
 PROJECT_ID = "betterbet-467621"
@@ -23,7 +22,8 @@ def verify_conversion():
     # Denominator: All Shots (Approx)
     den_types = ["Goal", "SavedShot", "MissedShots", "ShotOnPost", "BlockedPass"]
     
-    query = get_conversion_ranking_query(
+    client = get_bq_client(project=PROJECT_ID)
+    query, params = get_conversion_ranking_query(
         project_id=PROJECT_ID,
         dataset_id=DATASET_ID,
         subject="Equipes",
@@ -39,11 +39,11 @@ def verify_conversion():
         den_qualifiers="Todos (Qualquer)",
         
         teams=[TEAM],
-        players=None
+        players=None,
+        schedule_meta=load_schedule_meta(client, PROJECT_ID, DATASET_ID),
     )
     
-    client = get_bq_client(project=PROJECT_ID)
-    df = client.query(query).to_dataframe()
+    df = run_query(client, query, params)
     
     # Filter for 2025
     df = df[df['season'] == YEAR]
@@ -1,12 +1,11 @@
 import sys
 import os
 import pandas as pd
-from google.cloud import bigquery
 
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.bq_io import get_bq_client
+from src.bq_io import get_bq_client, load_schedule_meta, run_query
 from src.queries import get_dynamic_ranking_query
 
 PROJECT_ID = "betterbet-467621"
@@ -20,7 +19,8 @@ def verify_fix():
     # We simulate the exact call made by the app
     # Subject="Equipes", EventTypes=["Goal"], Outcomes=["Todos"], Quals=["Todos"], Teams=["Cruzeiro"]
     
-    query = get_dynamic_ranking_query(
+    client = get_bq_client(project=PROJECT_ID)
+    query, params = get_dynamic_ranking_query(
         project_id=PROJECT_ID,
         dataset_id=DATASET_ID,
         subject="Equipes",
@@ -29,13 +29,13 @@ def verify_fix():
         qualifiers="Todos (Qualquer)",
         use_related_player=False,
         teams=[TEAM],
-        players=None
+        players=None,
+        schedule_meta=load_schedule_meta(client, PROJECT_ID, DATASET_ID),
     )
     
     # print(query) # Debug if needed
     
-    client = get_bq_client(project=PROJECT_ID)
-    df = client.query(query).to_dataframe()
+    df = run_query(client, query, params)
     
     # Filter for 2025
     df_2025 = df[df['season'] == YEAR]
@@ -5,7 +5,7 @@ import pandas as pd
 from datetime import date
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
 
-from src.bq_io import get_bq_client
+from src.bq_io import get_bq_client, load_schedule_meta, run_query
 from src.queries import get_teams_match_count_query
 
 PROJECT_ID = "betterbet-467621"
@@ -20,11 +20,14 @@ def run_debug():
     
     print(f"Running Match Count Query for {teams} in {date_range}...")
     
-    q = get_teams_match_count_query(PROJECT_ID, DATASET_ID, teams, date_range)
+    q, params = get_teams_match_count_query(
+        PROJECT_ID, DATASET_ID, teams, date_range,
+        schedule_meta=load_schedule_meta(client, PROJECT_ID, DATASET_ID),
+    )
     print("Query sample:")
     print(q[:500])
     
-    df = client.query(q).to_dataframe()
+    df = run_query(client, q, params)
     
     print("\n--- Match Counts (Raw) ---")
     print(df)
@@ -45,9 +48,9 @@ def run_debug():
     print("\nIncorrect Merge Result (Duplicates expected if multiple seasons):")
     print(merged_incorrect)
     
-    # Correct Merge
-    df_grouped = df.groupby("team")["total_games"].sum().reset_index()
-    merged_correct = pd.merge(df_agg_mock, df_grouped, on="team", how="left")
+    # Correct Merge (sum per team on the index, then an index-aligned left join)
+    df_grouped = df.set_index("team").groupby(level=0)["total_games"].sum()
+    merged_correct = df_agg_mock.join(df_grouped, on="team")
     print("\nCorrect Merge Result:")
     print(merged_correct)
 